@@ -1,12 +1,14 @@
 import streamlit as st
 import pandas as pd
 import plotly.express as px
+from concurrent.futures import ThreadPoolExecutor, wait
 from datetime import datetime, timedelta
 import time
 import os
+import json
 
 import auth
-import data
+import cached
 import utils
 import database
 from recommendations import get_recommendations
@@ -19,17 +21,94 @@ st.set_page_config(
     initial_sidebar_state="expanded"
 )
 
-# Initialize session state variables
-if 'authenticated' not in st.session_state:
-    st.session_state.authenticated = False
-if 'username' not in st.session_state:
-    st.session_state.username = None
-if 'location' not in st.session_state:
-    st.session_state.location = "London"  # Default location
-if 'locations' not in st.session_state:
-    st.session_state.locations = []
-if 'current_aqi' not in st.session_state:
-    st.session_state.current_aqi = None
+@st.cache_resource(show_spinner=False)
+def _io_executor():
+    """
+    Thread pool shared by all sessions for running independent I/O concurrently
+    """
+    return ThreadPoolExecutor(max_workers=8, thread_name_prefix="airqual-io")
+
+# The cached loaders below can run on _io_executor threads, which have no
+# script context, so they must not render spinners themselves
+@st.cache_data(ttl=600, show_spinner=False)
+def load_history(username, location, start_date, end_date):
+    """
+    Load historical AQI readings as a DataFrame ready for plotting
+    """
+    historical_data = database.get_historical_aqi(
+        database.get_connection(),
+        username,
+        location,
+        start_date,
+        end_date
+    )
+    return pd.DataFrame(historical_data)
+
+@st.cache_data(ttl=600, show_spinner=False)
+def load_history_summary(username, location, start_date, end_date):
+    """
+    Load average, maximum and minimum AQI for a date range
+    """
+    return database.get_aqi_summary(
+        database.get_connection(),
+        username,
+        location,
+        start_date,
+        end_date
+    )
+
+@st.cache_data(ttl=3600, show_spinner=False)
+def _join_date(username):
+    """
+    Account creation date for the Profile tab; it never changes
+    """
+    return database.get_user_join_date(database.get_connection(), username)
+
+@st.cache_data(ttl=300, show_spinner=False)
+def _pollutant_figure(pollutant_items):
+    """
+    Build the pollutant bar chart once per set of readings
+    
+    Args:
+        pollutant_items (tuple): (name, value) pairs, hashable for the cache
+        
+    Returns:
+        str: Plotly figure as JSON
+    """
+    pollutant_names = [name for name, _ in pollutant_items]
+    pollutant_values = [value for _, value in pollutant_items]
+    
+    fig = px.bar(
+        x=pollutant_names,
+        y=pollutant_values,
+        labels={'x': 'Pollutant', 'y': 'Concentration (μg/m³)'},
+        color=pollutant_values,
+        color_continuous_scale=['green', 'yellow', 'orange', 'red'],
+        title="Pollutant Concentrations"
+    )
+    return fig.to_json()
+
+# Session state defaults
+DEFAULTS = {
+    'authenticated': False,
+    'username': None,
+    'location': 'London',
+    'locations': [],
+    'current_aqi': None,
+    'current_aqi_cat': None
+}
+
+# Initialize session state variables. A location in the URL (reload or
+# shared link) wins over the default.
+for key, value in DEFAULTS.items():
+    if key == 'location':
+        value = st.query_params.get("loc", value)
+    st.session_state.setdefault(key, value)
+
+# Keep the URL in step with the selected location so reloads and shared
+# links open it directly instead of fetching the default city first
+if st.query_params.get("loc") != st.session_state.location:
+    st.query_params["loc"] = st.session_state.location
 
 # Database connection
 conn = database.get_connection()
@@ -44,10 +123,13 @@ with st.sidebar:
         
         with tab1:
             st.subheader("Login")
-            username = st.text_input("Username", key="login_username")
-            password = st.text_input("Password", type="password", key="login_password")
+            # Inputs inside a form only trigger a rerun when it is submitted
+            with st.form("login_form", clear_on_submit=False):
+                username = st.text_input("Username", key="login_username")
+                password = st.text_input("Password", type="password", key="login_password")
+                submitted = st.form_submit_button("Login")
             
-            if st.button("Login"):
+            if submitted:
                 if auth.verify_user(conn, username, password):
                     st.session_state.authenticated = True
                     st.session_state.username = username
@@ -61,11 +143,13 @@ with st.sidebar:
         
         with tab2:
             st.subheader("Register")
-            new_username = st.text_input("Choose Username", key="reg_username")
-            new_password = st.text_input("Choose Password", type="password", key="reg_password")
-            confirm_password = st.text_input("Confirm Password", type="password", key="confirm_password")
+            with st.form("register_form", clear_on_submit=False):
+                new_username = st.text_input("Choose Username", key="reg_username")
+                new_password = st.text_input("Choose Password", type="password", key="reg_password")
+                confirm_password = st.text_input("Confirm Password", type="password", key="confirm_password")
+                submitted = st.form_submit_button("Register")
             
-            if st.button("Register"):
+            if submitted:
                 if new_password != confirm_password:
                     st.error("Passwords do not match")
                 elif auth.register_user(conn, new_username, new_password):
@@ -101,6 +185,362 @@ with st.sidebar:
             st.session_state.username = None
             st.rerun()
 
+# Tab views. Each tab is a fragment, so interacting with widgets inside
+# one tab only reruns that tab instead of the whole script.
+@st.fragment
+def _tab_current():
+    """
+    Current AQI tab: live AQI, pollutants and quick tips
+    """
+    st.title(f"Air Quality in {st.session_state.location}")
+    
+    # Use the full-page prefetch when there is one; failed and stale fetches
+    # aren't cached, so fetching again would hit the API twice
+    if "prefetched_aqi" in st.session_state:
+        aqi_data = st.session_state.pop("prefetched_aqi")
+    else:
+        with st.spinner("Fetching air quality data..."):
+            aqi_data = cached.current_aqi(st.session_state.location)
+        
+    if aqi_data and 'error' not in aqi_data:
+        st.session_state.current_aqi = aqi_data
+        
+        if aqi_data.get('stale'):
+            st.warning("The air quality service is unavailable right now. Showing the last known reading.")
+        
+        # Display AQI with color indicator
+        aqi_value = aqi_data.get('aqi', 0)
+        st.session_state.current_aqi_cat = utils.get_aqi_category(aqi_value)
+        aqi_category, aqi_color = st.session_state.current_aqi_cat
+        
+        col1, col2, col3 = st.columns([1, 2, 1])
+        
+        with col1:
+            st.metric("Current AQI", value=aqi_value)
+        
+        with col2:
+            with st.container(border=True):
+                st.html(f"<div style='background-color:{aqi_color};height:8px;border-radius:4px;'></div>")
+                st.subheader(aqi_category)
+        
+        with col3:
+            # Rerun the whole script after saving or removing so the
+            # sidebar and Profile tab lists update too; the current AQI
+            # comes from cached.current_aqi, so this doesn't refetch it
+            # Save location button
+            if st.session_state.location not in st.session_state.locations:
+                if st.button("Save Location"):
+                    st.session_state.locations.append(st.session_state.location)
+                    database.update_user_locations(conn, st.session_state.username, st.session_state.locations)
+                    cached.user_data.clear()
+                    st.success(f"{st.session_state.location} saved to your locations")
+                    st.rerun()
+            else:
+                if st.button("Remove Location"):
+                    st.session_state.locations.remove(st.session_state.location)
+                    database.update_user_locations(conn, st.session_state.username, st.session_state.locations)
+                    cached.user_data.clear()
+                    st.success(f"{st.session_state.location} removed from your locations")
+                    st.rerun()
+    elif aqi_data and 'error' in aqi_data and 'suggestions' in aqi_data:
+        # Display city suggestions
+        st.error(f"Location '{st.session_state.location}' not found. Did you mean one of these?")
+        
+        # Display city suggestions as buttons
+        suggestions = aqi_data.get('suggestions', [])
+        if suggestions:
+            cols = st.columns(min(3, len(suggestions)))
+            for i, suggestion in enumerate(suggestions[:6]):  # Show up to 6 suggestions
+                col_idx = i % len(cols)
+                with cols[col_idx]:
+                    if st.button(f"📍 {suggestion}", key=f"suggestion_{i}"):
+                        st.session_state.location = suggestion
+                        st.rerun()
+        
+        st.info("Please select a location from the suggestions or try a different search term.")
+        
+        # Display a list of popular cities to try
+        st.subheader("Popular Cities")
+        popular_cities = ["Shanghai", "Delhi", "Paris", "Berlin", "New York", "Los Angeles", 
+                         "Tokyo", "Seoul", "Beijing", "Mumbai", "London", "Bangkok"]
+        
+        # Create a grid of buttons for popular cities
+        cols = st.columns(3)
+        for i, city in enumerate(popular_cities):
+            col_idx = i % 3
+            with cols[col_idx]:
+                if st.button(f"🌆 {city}", key=f"popular_{i}"):
+                    st.session_state.location = city
+                    st.rerun()
+    elif aqi_data and 'aqi' in aqi_data:
+        # Display pollutants data
+        st.subheader("Pollutant Levels")
+        
+        pollutants = aqi_data.get('pollutants', {})
+        if pollutants:
+            fig = _pollutant_figure(tuple(pollutants.items()))
+            st.plotly_chart(json.loads(fig), use_container_width=True)
+            
+            # Add description of pollutants
+            with st.expander("Learn about these pollutants"):
+                st.markdown("""
+                - **PM2.5**: Fine particulate matter that can penetrate deep into the lungs and bloodstream
+                - **PM10**: Coarse particulate matter that can enter the respiratory system
+                - **O3**: Ozone at ground level can trigger respiratory problems
+                - **NO2**: Nitrogen Dioxide mainly from vehicle emissions, can cause respiratory inflammation
+                - **SO2**: Sulfur Dioxide from fossil fuel combustion, can cause respiratory issues
+                - **CO**: Carbon Monoxide, reduces oxygen delivery to organs
+                """)
+        else:
+            st.info("Detailed pollutant data not available for this location")
+        
+        # Quick health recommendations based on AQI
+        aqi_value = aqi_data.get('aqi', 0)
+        st.subheader("Quick Health Tips")
+        recommendations = get_recommendations(aqi_value)
+        
+        col1, col2 = st.columns(2)
+        
+        with col1:
+            st.subheader("General Advice")
+            st.write(recommendations['general'])
+            
+            st.subheader("Outdoor Activities")
+            st.write(recommendations['outdoor'])
+        
+        with col2:
+            st.subheader("Protection Measures")
+            st.write(recommendations['protection'])
+            
+            st.subheader("Health Watch")
+            st.write(recommendations['health'])
+        
+        # Save AQI data to database for history, unless it is an old
+        # reading served while the API is down
+        if not aqi_data.get('stale'):
+            database.save_aqi_reading(conn, st.session_state.username, st.session_state.location, aqi_value, aqi_data)
+        
+    else:
+        st.error("Failed to fetch air quality data. Please check the location name or try again later.")
+
+
+@st.fragment
+def _tab_history():
+    """
+    History tab: AQI trend and statistics for a date range
+    """
+    st.title("Historical AQI Data")
+    st.write("Track air quality trends over time")
+    
+    # Date range selector
+    col1, col2 = st.columns(2)
+    with col1:
+        start_date = st.date_input("Start date", datetime.now() - timedelta(days=7), key="history_start")
+    with col2:
+        end_date = st.date_input("End date", datetime.now(), key="history_end")
+    
+    if start_date > end_date:
+        st.error("Start date cannot be after end date")
+    else:
+        # Fetch historical data
+        df = load_history(
+            st.session_state.username, 
+            st.session_state.location,
+            start_date,
+            end_date
+        )
+        
+        if not df.empty:
+            # Line chart
+            fig = px.line(
+                df, 
+                x='timestamp', 
+                y='aqi', 
+                title=f"AQI Trend for {st.session_state.location}",
+                labels={'timestamp': 'Date', 'aqi': 'AQI Value'},
+                markers=True
+            )
+            
+            # Add color zones for AQI categories
+            fig.add_hrect(y0=0, y1=50, line_width=0, fillcolor="green", opacity=0.2)
+            fig.add_hrect(y0=50, y1=100, line_width=0, fillcolor="yellow", opacity=0.2)
+            fig.add_hrect(y0=100, y1=150, line_width=0, fillcolor="orange", opacity=0.2)
+            fig.add_hrect(y0=150, y1=200, line_width=0, fillcolor="red", opacity=0.2)
+            fig.add_hrect(y0=200, y1=300, line_width=0, fillcolor="purple", opacity=0.2)
+            fig.add_hrect(y0=300, y1=500, line_width=0, fillcolor="maroon", opacity=0.2)
+            
+            st.plotly_chart(fig, use_container_width=True)
+            
+            # Statistics are aggregated by the database rather than in pandas
+            summary = load_history_summary(
+                st.session_state.username, 
+                st.session_state.location,
+                start_date,
+                end_date
+            )
+            
+            if summary:
+                st.subheader("Statistics")
+                col1, col2, col3 = st.columns(3)
+                
+                with col1:
+                    st.metric("Average AQI", round(summary['avg'], 1))
+                
+                with col2:
+                    st.metric("Maximum AQI", summary['max'])
+                
+                with col3:
+                    st.metric("Minimum AQI", summary['min'])
+            
+            # AQI category breakdown
+            df['category'] = utils.get_aqi_categories(df['aqi'])
+            category_counts = df['category'].value_counts().reset_index()
+            category_counts.columns = ['Category', 'Days']
+            category_counts = category_counts[category_counts['Days'] > 0]
+            
+            fig = px.pie(
+                category_counts, 
+                values='Days', 
+                names='Category',
+                title="AQI Category Distribution",
+                color='Category',
+                color_discrete_map={
+                    'Good': 'green',
+                    'Moderate': 'yellow',
+                    'Unhealthy for Sensitive Groups': 'orange',
+                    'Unhealthy': 'red',
+                    'Very Unhealthy': 'purple',
+                    'Hazardous': 'maroon'
+                }
+            )
+            st.plotly_chart(fig, use_container_width=True)
+            
+        else:
+            st.info("No historical data available for this location and date range")
+
+
+@st.fragment
+def _tab_profile():
+    """
+    Profile tab: account details, saved locations and preferences
+    """
+    st.title("User Profile")
+    
+    # User information
+    st.subheader("Account Information")
+    st.write(f"**Username:** {st.session_state.username}")
+    join_date = _join_date(st.session_state.username)
+    st.write(f"**Member since:** {join_date}")
+    
+    # Saved locations
+    st.subheader("Saved Locations")
+    
+    if st.session_state.locations:
+        for i, location in enumerate(st.session_state.locations):
+            col1, col2 = st.columns([3, 1])
+            with col1:
+                st.write(f"📍 {location}")
+            with col2:
+                if st.button("View", key=f"view_{i}"):
+                    st.session_state.location = location
+                    st.rerun()
+    else:
+        st.info("You haven't saved any locations yet. Search for a location and click 'Save Location' to add it here.")
+    
+    # Account preferences
+    st.subheader("Preferences")
+    
+    # Shared with the profile page, which clears it when it saves the unit too
+    user_data = cached.user_data(st.session_state.username)
+    default_unit = user_data.get('unit', 'metric') if user_data else 'metric'
+    unit_system = st.selectbox(
+        "Unit System",
+        options=["metric", "imperial"],
+        index=0 if default_unit == "metric" else 1
+    )
+    
+    if st.button("Save Preferences"):
+        database.update_user_preference(conn, st.session_state.username, "unit", unit_system)
+        cached.user_data.clear()
+        st.success("Preferences updated!")
+
+
+@st.fragment
+def _tab_health():
+    """
+    Health Recommendations tab: detailed and personalized advice
+    """
+    st.title("Health Recommendations")
+    
+    if st.session_state.current_aqi:
+        aqi_value = st.session_state.current_aqi.get('aqi', 0)
+        aqi_category, aqi_color = st.session_state.current_aqi_cat or utils.get_aqi_category(aqi_value)
+        
+        # Display AQI status
+        with st.container(border=True):
+            st.html(f"<div style='background-color:{aqi_color};height:8px;border-radius:4px;'></div>")
+            st.subheader(f"Current AQI: {aqi_value} – {aqi_category}")
+        
+        # Get detailed recommendations
+        detailed_recs = get_recommendations(aqi_value, detailed=True)
+        
+        # General health advice
+        st.subheader("General Health Advice")
+        st.write(detailed_recs['general_detailed'])
+        
+        # Specific recommendations for different groups
+        st.subheader("Recommendations by Group")
+        
+        tabs = st.tabs(["General Population", "Sensitive Groups", "Children", "Elderly", "Outdoor Workers"])
+        
+        with tabs[0]:
+            st.write(detailed_recs['general_population'])
+            
+        with tabs[1]:
+            st.write(detailed_recs['sensitive_groups'])
+            
+        with tabs[2]:
+            st.write(detailed_recs['children'])
+            
+        with tabs[3]:
+            st.write(detailed_recs['elderly'])
+            
+        with tabs[4]:
+            st.write(detailed_recs['outdoor_workers'])
+        
+        # Protection measures
+        st.subheader("Protection Measures")
+        
+        col1, col2 = st.columns(2)
+        
+        with col1:
+            st.write("**Indoor Protection:**")
+            for item in detailed_recs['indoor_protection']:
+                st.write(f"- {item}")
+        
+        with col2:
+            st.write("**Outdoor Protection:**")
+            for item in detailed_recs['outdoor_protection']:
+                st.write(f"- {item}")
+        
+        # Long-term health impacts
+        st.subheader("Health Impact Information")
+        st.write(detailed_recs['health_impacts'])
+        
+        # AI-generated personalized recommendations
+        st.subheader("AI Health Assistant")
+        
+        user_health_condition = st.text_input("Do you have any specific health conditions? (e.g., asthma, COPD, heart disease)")
+        
+        if user_health_condition:
+            personalized_advice = utils.get_personalized_recommendation(aqi_value, user_health_condition)
+            st.write(personalized_advice)
+        else:
+            st.info("Enter your health conditions to receive personalized recommendations")
+        
+    else:
+        st.info("Please select a location to view health recommendations")
+
 # Main content
 if not st.session_state.authenticated:
     st.title("Welcome to AirQual")
@@ -111,11 +551,11 @@ if not st.session_state.authenticated:
     col1, col2 = st.columns(2)
     
     with col1:
-        st.image("https://cdn-icons-png.flaticon.com/512/4107/4107793.png", width=150)
+        st.image("static/realtime.png", width=150)
         st.write("Real-time air quality monitoring from anywhere in the world")
         
     with col2:
-        st.image("https://cdn-icons-png.flaticon.com/512/1186/1186330.png", width=150)
+        st.image("static/health.png", width=150)
         st.write("Personalized health recommendations based on air quality")
     
     st.subheader("Features")
@@ -133,336 +573,40 @@ if not st.session_state.authenticated:
         st.write(feature)
 
 else:
+    # Fetch the current AQI and the History tab's readings concurrently, so
+    # the page waits for the slower of the two instead of their sum. The tabs
+    # then get both results from the cached loaders.
+    history_start = st.session_state.get("history_start", (datetime.now() - timedelta(days=7)).date())
+    history_end = st.session_state.get("history_end", datetime.now().date())
+    
+    with st.spinner("Fetching air quality data..."):
+        executor = _io_executor()
+        prefetch = [executor.submit(cached.current_aqi, st.session_state.location)]
+        if history_start <= history_end:
+            prefetch.append(executor.submit(
+                load_history,
+                st.session_state.username,
+                st.session_state.location,
+                history_start,
+                history_end
+            ))
+        wait(prefetch)
+        st.session_state.prefetched_aqi = prefetch[0].result()
+    
     # Tabs for different sections
     tab1, tab2, tab3, tab4 = st.tabs(["Current AQI", "History", "Profile", "Health Recommendations"])
     
     with tab1:
-        st.title(f"Air Quality in {st.session_state.location}")
-        
-        # Fetch current AQI data
-        with st.spinner("Fetching air quality data..."):
-            aqi_data = data.get_current_aqi(st.session_state.location)
-            
-        if aqi_data and 'error' not in aqi_data:
-            st.session_state.current_aqi = aqi_data
-            
-            # Display AQI with color indicator
-            aqi_value = aqi_data.get('aqi', 0)
-            aqi_category, aqi_color = utils.get_aqi_category(aqi_value)
-            
-            col1, col2, col3 = st.columns([1, 2, 1])
-            
-            with col1:
-                st.metric("Current AQI", value=aqi_value)
-            
-            with col2:
-                st.markdown(
-                    f"<div style='background-color:{aqi_color};padding:10px;border-radius:5px;'>"
-                    f"<h2 style='text-align:center;color:white;'>{aqi_category}</h2>"
-                    "</div>",
-                    unsafe_allow_html=True
-                )
-            
-            with col3:
-                # Save location button
-                if st.session_state.location not in st.session_state.locations:
-                    if st.button("Save Location"):
-                        st.session_state.locations.append(st.session_state.location)
-                        database.update_user_locations(conn, st.session_state.username, st.session_state.locations)
-                        st.success(f"{st.session_state.location} saved to your locations")
-                        st.rerun()
-                else:
-                    if st.button("Remove Location"):
-                        st.session_state.locations.remove(st.session_state.location)
-                        database.update_user_locations(conn, st.session_state.username, st.session_state.locations)
-                        st.success(f"{st.session_state.location} removed from your locations")
-                        st.rerun()
-        elif aqi_data and 'error' in aqi_data and 'suggestions' in aqi_data:
-            # Display city suggestions
-            st.error(f"Location '{st.session_state.location}' not found. Did you mean one of these?")
-            
-            # Display city suggestions as buttons
-            suggestions = aqi_data.get('suggestions', [])
-            if suggestions:
-                cols = st.columns(min(3, len(suggestions)))
-                for i, suggestion in enumerate(suggestions[:6]):  # Show up to 6 suggestions
-                    col_idx = i % len(cols)
-                    with cols[col_idx]:
-                        if st.button(f"📍 {suggestion}", key=f"suggestion_{i}"):
-                            st.session_state.location = suggestion
-                            st.rerun()
-            
-            st.info("Please select a location from the suggestions or try a different search term.")
-            
-            # Display a list of popular cities to try
-            st.subheader("Popular Cities")
-            popular_cities = ["Shanghai", "Delhi", "Paris", "Berlin", "New York", "Los Angeles", 
-                             "Tokyo", "Seoul", "Beijing", "Mumbai", "London", "Bangkok"]
-            
-            # Create a grid of buttons for popular cities
-            cols = st.columns(3)
-            for i, city in enumerate(popular_cities):
-                col_idx = i % 3
-                with cols[col_idx]:
-                    if st.button(f"🌆 {city}", key=f"popular_{i}"):
-                        st.session_state.location = city
-                        st.rerun()
-        elif aqi_data and 'aqi' in aqi_data:
-            # Display pollutants data
-            st.subheader("Pollutant Levels")
-            
-            pollutants = aqi_data.get('pollutants', {})
-            if pollutants:
-                pollutant_names = list(pollutants.keys())
-                pollutant_values = [pollutants[p] for p in pollutant_names]
-                
-                fig = px.bar(
-                    x=pollutant_names,
-                    y=pollutant_values,
-                    labels={'x': 'Pollutant', 'y': 'Concentration (μg/m³)'},
-                    color=pollutant_values,
-                    color_continuous_scale=['green', 'yellow', 'orange', 'red'],
-                    title="Pollutant Concentrations"
-                )
-                st.plotly_chart(fig, use_container_width=True)
-                
-                # Add description of pollutants
-                with st.expander("Learn about these pollutants"):
-                    st.markdown("""
-                    - **PM2.5**: Fine particulate matter that can penetrate deep into the lungs and bloodstream
-                    - **PM10**: Coarse particulate matter that can enter the respiratory system
-                    - **O3**: Ozone at ground level can trigger respiratory problems
-                    - **NO2**: Nitrogen Dioxide mainly from vehicle emissions, can cause respiratory inflammation
-                    - **SO2**: Sulfur Dioxide from fossil fuel combustion, can cause respiratory issues
-                    - **CO**: Carbon Monoxide, reduces oxygen delivery to organs
-                    """)
-            else:
-                st.info("Detailed pollutant data not available for this location")
-            
-            # Quick health recommendations based on AQI
-            aqi_value = aqi_data.get('aqi', 0)
-            st.subheader("Quick Health Tips")
-            recommendations = get_recommendations(aqi_value)
-            
-            col1, col2 = st.columns(2)
-            
-            with col1:
-                st.subheader("General Advice")
-                st.write(recommendations['general'])
-                
-                st.subheader("Outdoor Activities")
-                st.write(recommendations['outdoor'])
-            
-            with col2:
-                st.subheader("Protection Measures")
-                st.write(recommendations['protection'])
-                
-                st.subheader("Health Watch")
-                st.write(recommendations['health'])
-            
-            # Save AQI data to database for history
-            database.save_aqi_reading(conn, st.session_state.username, st.session_state.location, aqi_value, aqi_data)
-            
-        else:
-            st.error("Failed to fetch air quality data. Please check the location name or try again later.")
+        _tab_current()
     
     with tab2:
-        st.title("Historical AQI Data")
-        st.write("Track air quality trends over time")
-        
-        # Date range selector
-        col1, col2 = st.columns(2)
-        with col1:
-            start_date = st.date_input("Start date", datetime.now() - timedelta(days=7))
-        with col2:
-            end_date = st.date_input("End date", datetime.now())
-        
-        if start_date > end_date:
-            st.error("Start date cannot be after end date")
-        else:
-            # Fetch historical data
-            historical_data = database.get_historical_aqi(
-                conn, 
-                st.session_state.username, 
-                st.session_state.location,
-                start_date,
-                end_date
-            )
-            
-            if historical_data:
-                # Convert to DataFrame for plotting
-                df = pd.DataFrame(historical_data)
-                
-                # Line chart
-                fig = px.line(
-                    df, 
-                    x='timestamp', 
-                    y='aqi', 
-                    title=f"AQI Trend for {st.session_state.location}",
-                    labels={'timestamp': 'Date', 'aqi': 'AQI Value'},
-                    markers=True
-                )
-                
-                # Add color zones for AQI categories
-                fig.add_hrect(y0=0, y1=50, line_width=0, fillcolor="green", opacity=0.2)
-                fig.add_hrect(y0=50, y1=100, line_width=0, fillcolor="yellow", opacity=0.2)
-                fig.add_hrect(y0=100, y1=150, line_width=0, fillcolor="orange", opacity=0.2)
-                fig.add_hrect(y0=150, y1=200, line_width=0, fillcolor="red", opacity=0.2)
-                fig.add_hrect(y0=200, y1=300, line_width=0, fillcolor="purple", opacity=0.2)
-                fig.add_hrect(y0=300, y1=500, line_width=0, fillcolor="maroon", opacity=0.2)
-                
-                st.plotly_chart(fig, use_container_width=True)
-                
-                # Statistics
-                st.subheader("Statistics")
-                col1, col2, col3 = st.columns(3)
-                
-                with col1:
-                    st.metric("Average AQI", round(df['aqi'].mean(), 1))
-                
-                with col2:
-                    st.metric("Maximum AQI", df['aqi'].max())
-                
-                with col3:
-                    st.metric("Minimum AQI", df['aqi'].min())
-                
-                # AQI category breakdown
-                df['category'] = df['aqi'].apply(lambda x: utils.get_aqi_category(x)[0])
-                category_counts = df['category'].value_counts().reset_index()
-                category_counts.columns = ['Category', 'Days']
-                
-                fig = px.pie(
-                    category_counts, 
-                    values='Days', 
-                    names='Category',
-                    title="AQI Category Distribution",
-                    color='Category',
-                    color_discrete_map={
-                        'Good': 'green',
-                        'Moderate': 'yellow',
-                        'Unhealthy for Sensitive Groups': 'orange',
-                        'Unhealthy': 'red',
-                        'Very Unhealthy': 'purple',
-                        'Hazardous': 'maroon'
-                    }
-                )
-                st.plotly_chart(fig, use_container_width=True)
-                
-            else:
-                st.info("No historical data available for this location and date range")
+        _tab_history()
     
     with tab3:
-        st.title("User Profile")
-        
-        # User information
-        st.subheader("Account Information")
-        st.write(f"**Username:** {st.session_state.username}")
-        join_date = database.get_user_join_date(conn, st.session_state.username)
-        st.write(f"**Member since:** {join_date}")
-        
-        # Saved locations
-        st.subheader("Saved Locations")
-        
-        if st.session_state.locations:
-            for i, location in enumerate(st.session_state.locations):
-                col1, col2 = st.columns([3, 1])
-                with col1:
-                    st.write(f"📍 {location}")
-                with col2:
-                    if st.button("View", key=f"view_{i}"):
-                        st.session_state.location = location
-                        st.rerun()
-        else:
-            st.info("You haven't saved any locations yet. Search for a location and click 'Save Location' to add it here.")
-        
-        # Account preferences
-        st.subheader("Preferences")
-        
-        default_unit = database.get_user_preference(conn, st.session_state.username, "unit") or "metric"
-        unit_system = st.selectbox(
-            "Unit System",
-            options=["metric", "imperial"],
-            index=0 if default_unit == "metric" else 1
-        )
-        
-        if st.button("Save Preferences"):
-            database.update_user_preference(conn, st.session_state.username, "unit", unit_system)
-            st.success("Preferences updated!")
+        _tab_profile()
     
     with tab4:
-        st.title("Health Recommendations")
-        
-        if st.session_state.current_aqi:
-            aqi_value = st.session_state.current_aqi.get('aqi', 0)
-            aqi_category, aqi_color = utils.get_aqi_category(aqi_value)
-            
-            # Display AQI status
-            st.markdown(
-                f"<div style='background-color:{aqi_color};padding:20px;border-radius:10px;margin-bottom:20px;'>"
-                f"<h2 style='text-align:center;color:white;'>Current AQI: {aqi_value} - {aqi_category}</h2>"
-                "</div>",
-                unsafe_allow_html=True
-            )
-            
-            # Get detailed recommendations
-            detailed_recs = get_recommendations(aqi_value, detailed=True)
-            
-            # General health advice
-            st.subheader("General Health Advice")
-            st.write(detailed_recs['general_detailed'])
-            
-            # Specific recommendations for different groups
-            st.subheader("Recommendations by Group")
-            
-            tabs = st.tabs(["General Population", "Sensitive Groups", "Children", "Elderly", "Outdoor Workers"])
-            
-            with tabs[0]:
-                st.write(detailed_recs['general_population'])
-                
-            with tabs[1]:
-                st.write(detailed_recs['sensitive_groups'])
-                
-            with tabs[2]:
-                st.write(detailed_recs['children'])
-                
-            with tabs[3]:
-                st.write(detailed_recs['elderly'])
-                
-            with tabs[4]:
-                st.write(detailed_recs['outdoor_workers'])
-            
-            # Protection measures
-            st.subheader("Protection Measures")
-            
-            col1, col2 = st.columns(2)
-            
-            with col1:
-                st.write("**Indoor Protection:**")
-                for item in detailed_recs['indoor_protection']:
-                    st.write(f"- {item}")
-            
-            with col2:
-                st.write("**Outdoor Protection:**")
-                for item in detailed_recs['outdoor_protection']:
-                    st.write(f"- {item}")
-            
-            # Long-term health impacts
-            st.subheader("Health Impact Information")
-            st.write(detailed_recs['health_impacts'])
-            
-            # AI-generated personalized recommendations
-            st.subheader("AI Health Assistant")
-            
-            user_health_condition = st.text_input("Do you have any specific health conditions? (e.g., asthma, COPD, heart disease)")
-            
-            if user_health_condition:
-                personalized_advice = utils.get_personalized_recommendation(aqi_value, user_health_condition)
-                st.write(personalized_advice)
-            else:
-                st.info("Enter your health conditions to receive personalized recommendations")
-            
-        else:
-            st.info("Please select a location to view health recommendations")
+        _tab_health()
 
 # Footer
 st.markdown("---")
@@ -1,63 +1,86 @@
 import hashlib
+import hmac
 import secrets
 import string
-from datetime import datetime
+from datetime import datetime, timedelta
+
+from database import pooled
+
+# scrypt cost parameters for new password hashes (32 MiB of memory per hash)
+SCRYPT_N = 2 ** 15
+SCRYPT_R = 8
+SCRYPT_P = 1
+SCRYPT_MAXMEM = 64 * 1024 * 1024
+SCRYPT_PREFIX = "scrypt$"
+
+def _scrypt(password, salt):
+    """
+    Derive a password hash with scrypt
+    """
+    return hashlib.scrypt(password.encode('utf-8'), salt=salt,
+                          n=SCRYPT_N, r=SCRYPT_R, p=SCRYPT_P,
+                          maxmem=SCRYPT_MAXMEM)
 
 def hash_password(password):
     """
     Hash a password for storing.
     """
-    salt = hashlib.sha256(secrets.token_bytes(32)).hexdigest()
-    pwdhash = hashlib.pbkdf2_hmac('sha256', password.encode('utf-8'), 
-                                  salt.encode('utf-8'), 100000)
-    pwdhash = pwdhash.hex()
-    return salt + pwdhash
+    salt = secrets.token_bytes(16)
+    pwdhash = _scrypt(password, salt)
+    return f"{SCRYPT_PREFIX}{salt.hex()}${pwdhash.hex()}"
 
 def verify_password(stored_password, provided_password):
     """
     Verify a stored password against one provided by user
-    """
-    salt = stored_password[:64]
-    stored_hash = stored_password[64:]
-    pwdhash = hashlib.pbkdf2_hmac('sha256', provided_password.encode('utf-8'), 
-                                  salt.encode('utf-8'), 100000)
+    
+    Hashes created before the switch to scrypt are PBKDF2-SHA256 and are
+    still accepted.
+    """
+    if stored_password.startswith(SCRYPT_PREFIX):
+        salt, stored_hash = stored_password[len(SCRYPT_PREFIX):].split('$', 1)
+        pwdhash = _scrypt(provided_password, bytes.fromhex(salt))
+    else:
+        salt = stored_password[:64]
+        stored_hash = stored_password[64:]
+        pwdhash = hashlib.pbkdf2_hmac('sha256', provided_password.encode('utf-8'), 
+                                      salt.encode('utf-8'), 100000)
     pwdhash = pwdhash.hex()
-    return pwdhash == stored_hash
+    return hmac.compare_digest(pwdhash, stored_hash)
 
+@pooled
 def register_user(conn, username, password):
     """
     Register a new user
     """
-    # Check if username already exists
-    cursor = conn.cursor()
-    cursor.execute("SELECT username FROM users WHERE username = %s", (username,))
-    if cursor.fetchone():
-        return False
-    
     # Hash the password
     hashed_password = hash_password(password)
     
-    # Insert new user
+    # Insert the user and their preferences entry in one round-trip. The
+    # username primary key makes an existing user a no-op, in which case no
+    # row is returned.
+    cursor = conn.cursor()
     try:
-        cursor.execute(
-            "INSERT INTO users (username, password, created_at) VALUES (%s, %s, %s)",
-            (username, hashed_password, datetime.now())
+        cursor.execute("""
+        WITH new_user AS (
+            INSERT INTO users (username, password, created_at)
+            VALUES (%s, %s, %s)
+            ON CONFLICT (username) DO NOTHING
+            RETURNING username
         )
+        INSERT INTO user_preferences (username, unit)
+        SELECT username, %s FROM new_user
+        RETURNING username
+        """, (username, hashed_password, datetime.now(), "metric"))
+        created = cursor.fetchone() is not None
         conn.commit()
         
-        # Create user preferences entry
-        cursor.execute(
-            "INSERT INTO user_preferences (username, unit) VALUES (%s, %s)",
-            (username, "metric")
-        )
-        conn.commit()
-        
-        return True
+        return created
     except Exception as e:
         print(f"Error registering user: {e}")
         conn.rollback()
         return False
 
+@pooled
 def verify_user(conn, username, password):
     """
     Verify user credentials
@@ -79,38 +102,45 @@ def generate_reset_token():
     alphabet = string.ascii_letters + string.digits
     return ''.join(secrets.choice(alphabet) for _ in range(32))
 
+@pooled
 def save_reset_token(conn, username, token, expiry):
     """
     Save reset token to database
     """
     cursor = conn.cursor()
+    
+    # Drop tokens that expired over a day ago so the table stays small
+    cursor.execute(
+        "DELETE FROM password_resets WHERE expiry < %s",
+        (datetime.now() - timedelta(days=1),)
+    )
+    
     cursor.execute(
         "INSERT INTO password_resets (username, token, expiry) VALUES (%s, %s, %s)",
         (username, token, expiry)
     )
     conn.commit()
 
+@pooled
 def verify_reset_token(conn, token):
     """
     Verify a reset token
     """
+    # Expired tokens are filtered out by the query itself. The current time
+    # comes from the app, which is also where expiry timestamps are created.
     cursor = conn.cursor()
     cursor.execute(
-        "SELECT username, expiry FROM password_resets WHERE token = %s",
-        (token,)
+        "SELECT username FROM password_resets WHERE token = %s AND expiry > %s",
+        (token, datetime.now())
     )
     result = cursor.fetchone()
     
     if not result:
         return None
     
-    username, expiry = result
-    
-    if datetime.now() > expiry:
-        return None
-    
-    return username
+    return result[0]
 
+@pooled
 def update_password(conn, username, new_password):
     """
     Update a user's password
@@ -122,9 +152,8 @@ def update_password(conn, username, new_password):
         "UPDATE users SET password = %s WHERE username = %s",
         (hashed_password, username)
     )
-    conn.commit()
     
-    # Remove used token
+    # Remove used token in the same transaction
     cursor.execute(
         "DELETE FROM password_resets WHERE username = %s",
         (username,)
@@ -0,0 +1,46 @@
+import streamlit as st
+
+import data
+import database
+
+class _Uncached(Exception):
+    """
+    Carries a result out of a cached loader so st.cache_data doesn't store it
+    """
+
+    def __init__(self, result):
+        super().__init__()
+        self.result = result
+
+# The loaders below can run on worker threads without a script context, so
+# they must not render spinners themselves
+@st.cache_data(ttl=300, max_entries=256, show_spinner=False)
+def _current_aqi(location):
+    """
+    Cached body of current_aqi
+    """
+    result = data.get_current_aqi(location)
+    if not result or result.get('stale'):
+        raise _Uncached(result)
+    return result
+
+def current_aqi(location):
+    """
+    Current AQI for a location, shared by every page and session for five
+    minutes
+
+    Failed fetches and stale fallback readings are returned but not cached,
+    so the next rerun tries the API again.
+    """
+    try:
+        return _current_aqi(location)
+    except _Uncached as e:
+        return e.result
+
+@st.cache_data(ttl=60, show_spinner=False)
+def user_data(username):
+    """
+    Profile data for a user, shared by the pages that show it; cleared
+    wherever saved locations or preferences are written
+    """
+    return database.get_user_data(database.get_connection(), username)
@@ -1,8 +1,22 @@
 import requests
-import pandas as pd
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+import numpy as np
 import time
 from datetime import datetime, timedelta
 import re
+import json
+import threading
+import urllib.parse
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+
+# orjson parses API responses several times faster when it is installed
+try:
+    import orjson
+    _json_loads = orjson.loads
+except ImportError:
+    _json_loads = json.loads
 
 # API URLs
 WAQI_BASE_URL = "https://api.waqi.info"
@@ -10,24 +24,181 @@ import os
 # Get API key from environment variables
 WAQI_API_KEY = os.environ.get("WAQI_API_KEY", "demo")
 
-def get_current_aqi(location):
+# Characters stripped from location names before querying the API
+_CLEAN_RE = re.compile(r'[^\w\s]')
+
+# (connect, read) timeout for API requests
+REQUEST_TIMEOUT = (2, 8)
+
+# Shared session so connections to the API are kept alive between calls.
+# Transient failures and rate limiting are retried with backoff.
+_SESSION = requests.Session()
+_SESSION.mount("https://", HTTPAdapter(
+    pool_connections=10,
+    pool_maxsize=50,
+    max_retries=Retry(
+        total=3,
+        backoff_factor=0.3,
+        status_forcelist=(429, 500, 502, 503, 504),
+        allowed_methods=frozenset(["GET"]),
+        respect_retry_after_header=True
+    )
+))
+
+# Response cache TTLs in seconds. Station feeds update roughly hourly;
+# search results for a keyword barely change.
+FEED_CACHE_TTL = 60
+SEARCH_CACHE_TTL = 24 * 60 * 60
+MAX_CACHE_ENTRIES = 512
+
+class CircuitOpenError(Exception):
+    """
+    Raised instead of calling the API while its circuit breaker is open
+    """
+
+class CircuitBreaker:
+    """
+    Stop calling a failing API for a while so callers don't each wait out
+    the full timeout during an outage
+    
+    After fail_threshold consecutive failures the circuit opens and calls
+    are refused for reset_timeout seconds. Then a single probe request is
+    let through: success closes the circuit, failure opens it again.
+    """
+    
+    def __init__(self, fail_threshold=5, reset_timeout=30):
+        self.fail_threshold = fail_threshold
+        self.reset_timeout = reset_timeout
+        self._failures = 0
+        self._opened_at = None
+        self._probing = False
+        self._lock = threading.Lock()
+    
+    @property
+    def open(self):
+        return self._opened_at is not None
+    
+    def allow_request(self):
+        with self._lock:
+            if self._opened_at is None:
+                return True
+            if self._probing or time.monotonic() - self._opened_at < self.reset_timeout:
+                return False
+            self._probing = True
+            return True
+    
+    def record_success(self):
+        with self._lock:
+            self._failures = 0
+            self._opened_at = None
+            self._probing = False
+    
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            self._probing = False
+            if self._failures >= self.fail_threshold:
+                self._opened_at = time.monotonic()
+
+_waqi_breaker = CircuitBreaker()
+
+# Runs city searches alongside feed requests in get_current_aqi
+_search_executor = ThreadPoolExecutor(max_workers=8, thread_name_prefix="waqi-search")
+
+# Last successful get_current_aqi result per location, served (marked
+# stale) while the API is unavailable; capped like the response cache
+_last_good = {}
+_last_good_lock = threading.Lock()
+
+# In-memory response cache: key -> (expires_at, parsed JSON)
+_response_cache = {}
+_response_cache_lock = threading.Lock()
+
+def _cache_key(url, params):
+    """
+    Response cache key; params are sorted so their order doesn't matter
+    """
+    return (url, tuple(sorted((params or {}).items())))
+
+def _cache_get(key, now=None):
+    """
+    Return a cached response if it hasn't expired, else None
+    """
+    with _response_cache_lock:
+        cached = _response_cache.get(key)
+    if cached and cached[0] > (now or time.monotonic()):
+        return cached[1]
+    return None
+
+def _http_get_json(url, params=None, ttl=FEED_CACHE_TTL, bypass_cache=False):
+    """
+    GET a URL and return the parsed JSON, reusing recent responses
+    
+    Args:
+        url (str): Request URL
+        params (dict): Query parameters
+        ttl (int): Seconds a cached response stays valid
+        bypass_cache (bool): Always hit the network and refresh the cache
+        
+    Returns:
+        dict: Parsed JSON response
+    """
+    key = _cache_key(url, params)
+    now = time.monotonic()
+    
+    if not bypass_cache:
+        cached = _cache_get(key, now)
+        if cached is not None:
+            return cached
+    
+    if not _waqi_breaker.allow_request():
+        raise CircuitOpenError("WAQI API is unavailable, try again shortly")
+    
+    try:
+        response = _SESSION.get(url, params=params, timeout=REQUEST_TIMEOUT)
+        data = _json_loads(response.content)
+    except Exception:
+        _waqi_breaker.record_failure()
+        raise
+    _waqi_breaker.record_success()
+    
+    with _response_cache_lock:
+        if len(_response_cache) >= MAX_CACHE_ENTRIES:
+            # Drop expired entries first, then the oldest if still full
+            for k in [k for k, (expires, _) in _response_cache.items() if expires <= now]:
+                del _response_cache[k]
+            if len(_response_cache) >= MAX_CACHE_ENTRIES:
+                del _response_cache[next(iter(_response_cache))]
+        _response_cache[key] = (now + ttl, data)
+    
+    return data
+
+def get_current_aqi(location, bypass_cache=False):
     """
     Fetch current Air Quality Index for a location
     
     Args:
         location (str): City name
+        bypass_cache (bool): Skip cached API responses
         
     Returns:
-        dict: Dictionary containing AQI and pollutant data
+        dict: Dictionary containing AQI and pollutant data; while the API
+            is unreachable, the last good result with 'stale': True
     """
     try:
-        # Clean the location name - remove special characters and ensure it's properly formatted
-        location = clean_location_name(location)
+        # Fetch data from WAQI API
+        api_url = _feed_url(location)
+        feed_params = {'token': WAQI_API_KEY}
         
-        # Fetch data directly from WAQI API
-        api_url = f"{WAQI_BASE_URL}/feed/{location}/?token={WAQI_API_KEY}"
-        response = requests.get(api_url)
-        data = response.json()
+        # On a cache miss, start the city search at the same time as the
+        # feed request so a miss costs one round-trip instead of two. The
+        # search result is only used if the feed doesn't find the city.
+        search = None
+        data = None if bypass_cache else _cache_get(_cache_key(api_url, feed_params))
+        if data is None:
+            if not _waqi_breaker.open:
+                search = _search_executor.submit(search_city, _search_keyword(location), bypass_cache)
+            data = _http_get_json(api_url, feed_params, FEED_CACHE_TTL, bypass_cache)
         
         if data['status'] == 'ok':
             aqi = data['data']['aqi']
@@ -53,16 +224,18 @@ def get_current_aqi(location):
             # Get location name from the API response
             display_location = data['data']['city'].get('name', location)
             
-            return {
+            result = {
                 'aqi': aqi,
                 'pollutants': pollutants,
                 'location': display_location,
                 'timestamp': datetime.now().isoformat(),
                 'dominentpol': data['data'].get('dominentpol', 'unknown')
             }
+            _remember_good(location, result)
+            return result
         else:
             # If this specific city name didn't work, try to find similar cities
-            similar_cities = search_city(location)
+            similar_cities = search.result() if search else search_city(_search_keyword(location), bypass_cache)
             if similar_cities:
                 # We don't want to automatically choose a city - we'll provide suggestions
                 # Return None with suggestions
@@ -72,10 +245,34 @@ def get_current_aqi(location):
                 }
             return None
             
+    except (CircuitOpenError, requests.RequestException) as e:
+        print(f"Error fetching AQI data: {e}")
+        # The API is unreachable; fall back to the last reading we got for
+        # this location, if any
+        return _stale_result(location)
     except Exception as e:
         print(f"Error fetching AQI data: {e}")
         return None
 
+def _remember_good(location, result):
+    """
+    Keep a location's latest successful result, evicting the least
+    recently updated location once MAX_CACHE_ENTRIES are stored
+    """
+    with _last_good_lock:
+        _last_good.pop(location, None)
+        if len(_last_good) >= MAX_CACHE_ENTRIES:
+            del _last_good[next(iter(_last_good))]
+        _last_good[location] = result
+
+def _stale_result(location):
+    """
+    Copy of the last good result for a location marked 'stale', or None
+    """
+    with _last_good_lock:
+        result = _last_good.get(location)
+    return {**result, 'stale': True} if result else None
+
 def clean_location_name(location):
     """
     Clean the location name for API query
@@ -86,26 +283,42 @@ def clean_location_name(location):
     Returns:
         str: Cleaned location name
     """
-    # Remove special characters except for spaces
-    location = re.sub(r'[^\w\s]', '', location)
-    # Replace spaces with URL-friendly format
-    location = location.replace(' ', '%20')
-    return location
+    # Remove special characters except for spaces, then percent-encode
+    # what's left for use as a URL path segment
+    return urllib.parse.quote(_CLEAN_RE.sub('', location).strip(), safe='')
+
+@lru_cache(maxsize=1024)
+def _feed_url(location):
+    """
+    WAQI feed URL for a location, cleaned and encoded once per name
+    """
+    return f"{WAQI_BASE_URL}/feed/{clean_location_name(location)}/"
+
+def _search_keyword(location):
+    """
+    Location name with special characters removed, for the search API
+    """
+    return _CLEAN_RE.sub('', location).strip()
 
-def search_city(keyword):
+def search_city(keyword, bypass_cache=False):
     """
     Search for cities by keyword
     
     Args:
         keyword (str): Search keyword
+        bypass_cache (bool): Skip cached API responses
         
     Returns:
         list: List of matching city names
     """
     try:
-        search_url = f"{WAQI_BASE_URL}/search/?token={WAQI_API_KEY}&keyword={keyword}"
-        response = requests.get(search_url)
-        data = response.json()
+        search_url = f"{WAQI_BASE_URL}/search/"
+        data = _http_get_json(
+            search_url,
+            {'token': WAQI_API_KEY, 'keyword': keyword},
+            SEARCH_CACHE_TTL,
+            bypass_cache
+        )
         
         if data['status'] == 'ok' and 'data' in data:
             # Extract city names from search results
@@ -119,43 +332,60 @@ def search_city(keyword):
         print(f"Error searching cities: {e}")
         return []
 
+# Concentration breakpoints and the AQI values they map to. Each segment
+# is interpolated linearly; the last one extends past its upper bound.
+# AQI is a whole number in a small range, so float32 is precise enough.
+PM25_BP = np.array([0, 12, 35.4, 55.4, 150.4, 250.4, 500.4], dtype=np.float32)
+PM10_BP = np.array([0, 54, 154, 254, 354, 424, 600], dtype=np.float32)
+AQI_BP = np.array([0, 50, 100, 150, 200, 300, 500], dtype=np.float32)
+
+def calculate_aqi_vec(concentrations, breakpoints=PM25_BP):
+    """
+    Calculate AQI for an array of concentrations in one vectorized pass
+    
+    Args:
+        concentrations (array-like): Finite pollutant concentrations
+        breakpoints (np.ndarray): PM25_BP or PM10_BP
+        
+    Returns:
+        np.ndarray: AQI values truncated to whole numbers (int16)
+    """
+    c = np.asarray(concentrations).astype(np.float32, copy=False)
+    # Segments are closed on the right, so a value equal to a breakpoint
+    # belongs to the lower segment
+    idx = np.searchsorted(breakpoints[1:-1], c, side='left')
+    lo = breakpoints[idx]
+    hi = breakpoints[idx + 1]
+    aqi = AQI_BP[idx] + (AQI_BP[idx + 1] - AQI_BP[idx]) * (c - lo) / (hi - lo)
+    # Round off float noise first so exact whole values aren't truncated down
+    return np.trunc(np.round(aqi, 3)).astype(np.int16)
+
+# Pollutants that calculate_aqi looks at, in order of preference
+AQI_INPUTS = ('pm25', 'pm10', 'no2', 'o3')
+
 def calculate_aqi(pollutants):
     """
     Calculate AQI based on pollutant concentrations
     This is a simplified calculation for demonstration purposes
     """
+    # Only the AQI inputs affect the result, so the memo key ignores the rest
+    key = tuple((name, pollutants[name]) for name in AQI_INPUTS if name in pollutants)
+    return _calculate_aqi_cached(key)
+
+@lru_cache(maxsize=8192)
+def _calculate_aqi_cached(items):
+    """
+    Memoized body of calculate_aqi, keyed on (pollutant, value) pairs
+    """
+    pollutants = dict(items)
+    
     # If we have PM2.5, use it as the primary indicator (simplified approach)
     if 'pm25' in pollutants:
-        pm25 = pollutants['pm25']
-        # Simple linear mapping for PM2.5 to AQI (simplified)
-        if pm25 <= 12:
-            return int(50 * (pm25 / 12))
-        elif pm25 <= 35.4:
-            return int(50 + (50 * (pm25 - 12) / 23.4))
-        elif pm25 <= 55.4:
-            return int(100 + (50 * (pm25 - 35.4) / 20))
-        elif pm25 <= 150.4:
-            return int(150 + (50 * (pm25 - 55.4) / 95))
-        elif pm25 <= 250.4:
-            return int(200 + (100 * (pm25 - 150.4) / 100))
-        else:
-            return int(300 + (200 * (pm25 - 250.4) / 250))
+        return int(calculate_aqi_vec(pollutants['pm25'], PM25_BP))
     
     # Alternative calculation using PM10 if PM2.5 is not available
     elif 'pm10' in pollutants:
-        pm10 = pollutants['pm10']
-        if pm10 <= 54:
-            return int(50 * (pm10 / 54))
-        elif pm10 <= 154:
-            return int(50 + (50 * (pm10 - 54) / 100))
-        elif pm10 <= 254:
-            return int(100 + (50 * (pm10 - 154) / 100))
-        elif pm10 <= 354:
-            return int(150 + (50 * (pm10 - 254) / 100))
-        elif pm10 <= 424:
-            return int(200 + (100 * (pm10 - 354) / 70))
-        else:
-            return int(300 + (200 * (pm10 - 424) / 176))
+        return int(calculate_aqi_vec(pollutants['pm10'], PM10_BP))
     
     # Fallback to NO2 or O3 with very simple mapping
     elif 'no2' in pollutants:
@@ -166,25 +396,22 @@ def calculate_aqi(pollutants):
     # Default AQI if no relevant pollutants are available
     return 50  # Assume moderate air quality when data is incomplete
 
-def get_historical_aqi(location, days=7):
+def get_historical_aqi(location, days=7, bypass_cache=False):
     """
     Fetch historical AQI data for a location from database or API
     
     Args:
         location (str): City name
         days (int): Number of days of historical data to retrieve
+        bypass_cache (bool): Skip cached API responses
         
     Returns:
         list: List of dictionaries with historical AQI readings
     """
     try:
-        # Clean the location name for API query
-        location = clean_location_name(location)
-        
         # Get current AQI first to check if the location exists
-        api_url = f"{WAQI_BASE_URL}/feed/{location}/?token={WAQI_API_KEY}"
-        response = requests.get(api_url)
-        data = response.json()
+        api_url = _feed_url(location)
+        data = _http_get_json(api_url, {'token': WAQI_API_KEY}, FEED_CACHE_TTL, bypass_cache)
         
         if data['status'] != 'ok':
             return None
@@ -192,40 +419,40 @@ def get_historical_aqi(location, days=7):
         # Extract forecast data which contains historical data
         forecast_data = data['data'].get('forecast', {}).get('daily', {})
         
+        # Index the other pollutants' daily averages by day once, keeping
+        # the first entry for a day, so each PM2.5 day is a dict lookup
+        extra_pollutants = {'pm10': 'PM10', 'o3': 'O3'}
+        by_day = {}
+        for key in extra_pollutants:
+            days_avg = {}
+            for entry in forecast_data.get(key, []):
+                if 'day' in entry:
+                    days_avg.setdefault(entry['day'], entry['avg'])
+            by_day[key] = days_avg
+        
         # Process historical data
         historical_aqi = []
         
         # Get PM2.5 historical data
-        if 'pm25' in forecast_data:
-            pm25_data = forecast_data['pm25']
-            for entry in pm25_data:
-                if 'day' in entry and 'avg' in entry:
-                    day = entry['day']
-                    avg = entry['avg']
-                    
-                    pollutants = {'PM2.5': avg}
-                    
-                    # Find matching PM10 data for the same day if available
-                    if 'pm10' in forecast_data:
-                        for pm10_entry in forecast_data['pm10']:
-                            if pm10_entry.get('day') == day:
-                                pollutants['PM10'] = pm10_entry['avg']
-                                break
-                    
-                    # Find matching O3 data for the same day if available
-                    if 'o3' in forecast_data:
-                        for o3_entry in forecast_data['o3']:
-                            if o3_entry.get('day') == day:
-                                pollutants['O3'] = o3_entry['avg']
-                                break
-                    
-                    # Calculate AQI (in this case, we can use the avg value directly as it's already the AQI)
-                    historical_aqi.append({
-                        'date': day,
-                        'aqi': avg,  # Using PM2.5 average as AQI
-                        'pollutants': pollutants,
-                        'timestamp': datetime.strptime(day, "%Y-%m-%d").isoformat()
-                    })
+        for entry in forecast_data.get('pm25', []):
+            if 'day' in entry and 'avg' in entry:
+                day = entry['day']
+                avg = entry['avg']
+                
+                pollutants = {'PM2.5': avg}
+                
+                # Add PM10 and O3 for the same day if available
+                for key, display_name in extra_pollutants.items():
+                    if day in by_day[key]:
+                        pollutants[display_name] = by_day[key][day]
+                
+                # Calculate AQI (in this case, we can use the avg value directly as it's already the AQI)
+                historical_aqi.append({
+                    'date': day,
+                    'aqi': avg,  # Using PM2.5 average as AQI
+                    'pollutants': pollutants,
+                    'timestamp': datetime.fromisoformat(day).isoformat()
+                })
         
         # Sort by date
         historical_aqi.sort(key=lambda x: x['date'], reverse=True)
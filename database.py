@@ -1,39 +1,135 @@
 import os
-import psycopg2
-from psycopg2.extras import Json
+import threading
+from functools import wraps
+import streamlit as st
+from psycopg2.extras import Json, execute_values, register_default_jsonb
+from psycopg2.extensions import TRANSACTION_STATUS_IDLE
+from psycopg2.pool import AbstractConnectionPool, ThreadedConnectionPool
 from datetime import datetime
 import json
 
+# Use orjson for JSONB columns when it is installed
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+if orjson:
+    register_default_jsonb(loads=orjson.loads, globally=True)
+    
+    def _json_dumps(value):
+        return orjson.dumps(value).decode()
+else:
+    _json_dumps = json.dumps
+
+def _jsonb(value):
+    """
+    Adapt a Python object for a JSONB parameter
+    """
+    return Json(value, dumps=_json_dumps)
+
+# Size of the shared connection pool. ThreadedConnectionPool raises
+# PoolError instead of waiting when every connection is checked out, so
+# borrowers first take a slot and wait for one to free up.
+POOL_MIN_CONNECTIONS = 1
+POOL_MAX_CONNECTIONS = 10
+_POOL_SLOTS = threading.BoundedSemaphore(POOL_MAX_CONNECTIONS)
+
+# Granularities accepted by get_historical_aqi(bucket=...)
+HISTORY_BUCKETS = ('hour', 'day')
+
+@st.cache_resource(show_spinner=False)
+def _connect():
+    """
+    Open the shared PostgreSQL connection pool and create tables if needed
+    """
+    # Get connection details from environment variables
+    host = os.getenv("PGHOST")
+    port = os.getenv("PGPORT")
+    user = os.getenv("PGUSER")
+    password = os.getenv("PGPASSWORD")
+    database = os.getenv("PGDATABASE")
+    
+    # Connect to PostgreSQL
+    conn_pool = ThreadedConnectionPool(
+        POOL_MIN_CONNECTIONS,
+        POOL_MAX_CONNECTIONS,
+        host=host,
+        port=port,
+        user=user,
+        password=password,
+        database=database
+    )
+    
+    # Create tables if they don't exist, once per pool
+    with _POOL_SLOTS:
+        conn = conn_pool.getconn()
+        try:
+            initialize_database(conn)
+        finally:
+            conn_pool.putconn(conn)
+    
+    return conn_pool
+
 def get_connection():
     """
-    Get a connection to the PostgreSQL database
+    Get the PostgreSQL connection pool
+    
+    The pool is created once per process and reused across Streamlit
+    reruns and sessions. Functions in this module and in auth accept it
+    in place of a connection and borrow one for the duration of the call.
     """
     try:
-        # Get connection details from environment variables
-        host = os.getenv("PGHOST")
-        port = os.getenv("PGPORT")
-        user = os.getenv("PGUSER")
-        password = os.getenv("PGPASSWORD")
-        database = os.getenv("PGDATABASE")
-        
-        # Connect to PostgreSQL
-        conn = psycopg2.connect(
-            host=host,
-            port=port,
-            user=user,
-            password=password,
-            database=database
-        )
+        conn_pool = _connect()
         
-        # Create tables if they don't exist
-        initialize_database(conn)
+        # Recreate the pool if it has been closed
+        if conn_pool.closed:
+            _connect.clear()
+            conn_pool = _connect()
         
-        return conn
+        return conn_pool
     except Exception as e:
         print(f"Database connection error: {e}")
         # Return None or raise an exception based on your error handling strategy
         return None
 
+def pooled(func):
+    """
+    Let a function taking a connection as its first argument be called
+    with the connection pool instead
+    
+    A connection is taken from the pool for the call and returned after it,
+    so concurrent sessions never share a connection. When every connection
+    is in use the call waits for one to be returned.
+    """
+    @wraps(func)
+    def wrapper(conn, *args, **kwargs):
+        if not isinstance(conn, AbstractConnectionPool):
+            return func(conn, *args, **kwargs)
+        
+        conn_pool = conn
+        with _POOL_SLOTS:
+            conn = conn_pool.getconn()
+            try:
+                return func(conn, *args, **kwargs)
+            finally:
+                _release(conn_pool, conn)
+    return wrapper
+
+def _release(conn_pool, conn):
+    """
+    Return a borrowed connection to the pool, rolling back anything the
+    borrower left uncommitted so the next borrower starts clean
+    """
+    broken = bool(conn.closed)
+    if not broken and conn.info.transaction_status != TRANSACTION_STATUS_IDLE:
+        try:
+            conn.rollback()
+        except Exception as e:
+            print(f"Error rolling back pooled connection: {e}")
+            broken = True
+    conn_pool.putconn(conn, close=broken)
+
 def initialize_database(conn):
     """
     Create required tables if they don't exist
@@ -73,6 +169,14 @@ def initialize_database(conn):
     )
     """)
     
+    # Index for per-user, per-location history lookups by time range. The
+    # history queries compare timestamp directly (no ::date cast) so they
+    # can use it.
+    cursor.execute("""
+    CREATE INDEX IF NOT EXISTS idx_aqi_readings_user_loc_ts
+    ON aqi_readings (username, location, timestamp)
+    """)
+    
     # Create password resets table
     cursor.execute("""
     CREATE TABLE IF NOT EXISTS password_resets (
@@ -83,8 +187,15 @@ def initialize_database(conn):
     )
     """)
     
+    # Reset tokens are looked up by token alone
+    cursor.execute("""
+    CREATE INDEX IF NOT EXISTS idx_password_resets_token
+    ON password_resets (token)
+    """)
+    
     conn.commit()
 
+@pooled
 def get_user_data(conn, username):
     """
     Get user data and preferences
@@ -107,25 +218,16 @@ def get_user_data(conn, username):
     
     username, created_at, saved_locations, unit, notification_preferences = result
     
-    # Convert JSONB to Python dicts/lists
-    if saved_locations:
-        saved_locations = json.loads(saved_locations)
-    else:
-        saved_locations = []
-        
-    if notification_preferences:
-        notification_preferences = json.loads(notification_preferences)
-    else:
-        notification_preferences = {}
-        
+    # psycopg2 already decodes JSONB columns into Python lists/dicts
     return {
         'username': username,
         'created_at': created_at,
-        'saved_locations': saved_locations,
+        'saved_locations': saved_locations or [],
         'unit': unit,
-        'notification_preferences': notification_preferences
+        'notification_preferences': notification_preferences or {}
     }
 
+@pooled
 def update_user_locations(conn, username, locations):
     """
     Update a user's saved locations
@@ -135,11 +237,14 @@ def update_user_locations(conn, username, locations):
         
     cursor = conn.cursor()
     try:
+        # Store the whole list as one JSONB value, creating the preferences
+        # row if the user doesn't have one yet
         cursor.execute("""
-        UPDATE user_preferences
-        SET saved_locations = %s
-        WHERE username = %s
-        """, (Json(locations), username))
+        INSERT INTO user_preferences (username, saved_locations)
+        VALUES (%s, %s)
+        ON CONFLICT (username) DO UPDATE
+        SET saved_locations = EXCLUDED.saved_locations
+        """, (username, _jsonb(locations)))
         conn.commit()
         return True
     except Exception as e:
@@ -147,79 +252,63 @@ def update_user_locations(conn, username, locations):
         conn.rollback()
         return False
 
+# Preference names that may be read or written, mapped to their
+# user_preferences column and whether it is JSONB. Column names are
+# interpolated into SQL, so only names listed here are ever accepted.
+_PREF_COLS = {
+    'saved_locations': ('saved_locations', True),
+    'unit': ('unit', False),
+    'notification_preferences': ('notification_preferences', True)
+}
+
+def _select_prefs(conn, username, preferences):
+    """
+    Fetch several preference columns for a user in one query
+    
+    Returns:
+        tuple: Column values in the order requested, or None if the user
+        has no preferences row
+    """
+    columns = ", ".join(_PREF_COLS[preference][0] for preference in preferences)
+    cursor = conn.cursor()
+    cursor.execute(
+        f"SELECT {columns} FROM user_preferences WHERE username = %s",
+        (username,)
+    )
+    return cursor.fetchone()
+
+@pooled
 def get_user_preference(conn, username, preference):
     """
     Get a specific user preference
     """
-    if not conn:
-        return None
-        
-    cursor = conn.cursor()
-    
-    if preference == 'saved_locations':
-        cursor.execute("""
-        SELECT saved_locations
-        FROM user_preferences
-        WHERE username = %s
-        """, (username,))
-    elif preference == 'unit':
-        cursor.execute("""
-        SELECT unit
-        FROM user_preferences
-        WHERE username = %s
-        """, (username,))
-    elif preference == 'notification_preferences':
-        cursor.execute("""
-        SELECT notification_preferences
-        FROM user_preferences
-        WHERE username = %s
-        """, (username,))
-    else:
+    if not conn or preference not in _PREF_COLS:
         return None
         
-    result = cursor.fetchone()
+    result = _select_prefs(conn, username, (preference,))
     
     if not result:
         return None
         
-    value = result[0]
-    
-    # Convert JSONB to Python objects if needed
-    if preference in ['saved_locations', 'notification_preferences'] and value:
-        return json.loads(value)
-    
-    return value
+    # JSONB values arrive already decoded
+    return result[0]
 
+@pooled
 def update_user_preference(conn, username, preference, value):
     """
     Update a specific user preference
     """
-    if not conn:
+    if not conn or preference not in _PREF_COLS:
         return False
         
+    column, is_jsonb = _PREF_COLS[preference]
+    
     cursor = conn.cursor()
     try:
-        if preference == 'saved_locations':
-            cursor.execute("""
-            UPDATE user_preferences
-            SET saved_locations = %s
-            WHERE username = %s
-            """, (Json(value), username))
-        elif preference == 'unit':
-            cursor.execute("""
-            UPDATE user_preferences
-            SET unit = %s
-            WHERE username = %s
-            """, (value, username))
-        elif preference == 'notification_preferences':
-            cursor.execute("""
-            UPDATE user_preferences
-            SET notification_preferences = %s
-            WHERE username = %s
-            """, (Json(value), username))
-        else:
-            return False
-            
+        cursor.execute(
+            f"UPDATE user_preferences SET {column} = %s WHERE username = %s",
+            (_jsonb(value) if is_jsonb else value, username)
+        )
         conn.commit()
         return True
     except Exception as e:
@@ -230,40 +319,118 @@ def update_user_preference(conn, username, preference, value):
 def save_aqi_reading(conn, username, location, aqi_value, data):
     """
     Save an AQI reading to the database
+    
+    Returns:
+        int: id of the new reading, or False on failure
     """
-    if not conn:
-        return False
+    ids = save_aqi_readings_bulk(conn, [(username, location, aqi_value, datetime.now(), data)])
+    return ids[0] if ids else False
+
+@pooled
+def save_aqi_readings_bulk(conn, rows):
+    """
+    Save many AQI readings in one transaction, so a failure saves none
+    
+    Args:
+        conn: Database connection
+        rows (list): (username, location, aqi_value, timestamp, data) tuples
+        
+    Returns:
+        list: ids of the inserted readings, or an empty list on failure
+    """
+    if not conn or not rows:
+        return []
         
     cursor = conn.cursor()
     try:
-        pollutants = data.get('pollutants', {})
-        timestamp = datetime.now()
+        values = [
+            (username, location, aqi_value, timestamp, _jsonb(data.get('pollutants', {})), _jsonb(data))
+            for username, location, aqi_value, timestamp, data in rows
+        ]
         
-        cursor.execute("""
+        ids = execute_values(cursor, """
         INSERT INTO aqi_readings (username, location, aqi_value, timestamp, pollutants, data)
-        VALUES (%s, %s, %s, %s, %s, %s)
-        """, (username, location, aqi_value, timestamp, Json(pollutants), Json(data)))
+        VALUES %s
+        RETURNING id
+        """, values, page_size=500, fetch=True)
         
         conn.commit()
-        return True
+        return [row[0] for row in ids]
     except Exception as e:
-        print(f"Error saving AQI reading: {e}")
+        print(f"Error saving AQI readings: {e}")
         conn.rollback()
+        return []
+
+@pooled
+def has_history(conn, username, location, start_date, min_readings=1):
+    """
+    Check whether a user has at least min_readings AQI readings for a
+    location since a date without fetching them
+    """
+    if not conn:
+        return False
+        
+    cursor = conn.cursor()
+    try:
+        # Stop counting once enough readings have been found
+        cursor.execute("""
+        SELECT COUNT(*) >= %s FROM (
+            SELECT 1 FROM aqi_readings
+            WHERE username = %s AND location = %s AND timestamp >= %s
+            LIMIT %s
+        ) AS recent
+        """, (min_readings, username, location, start_date, min_readings))
+        
+        return cursor.fetchone()[0]
+    except Exception as e:
+        print(f"Error checking AQI history: {e}")
         return False
 
-def get_historical_aqi(conn, username, location, start_date, end_date):
+@pooled
+def get_historical_aqi(conn, username, location, start_date, end_date, bucket=None):
     """
     Get historical AQI readings for a user and location within a date range
+    
+    With bucket ('hour' or 'day') the readings are aggregated in the database
+    and each row holds the bucket start with its average, maximum and minimum
+    AQI and the number of readings, instead of the raw pollutant data
     """
     if not conn:
         return []
+    
+    if bucket is not None and bucket not in HISTORY_BUCKETS:
+        print(f"Error retrieving historical AQI: unsupported bucket {bucket!r}")
+        return []
         
     cursor = conn.cursor()
     try:
+        if bucket:
+            cursor.execute("""
+            SELECT date_trunc(%s, timestamp) AS bucket, AVG(aqi_value), MAX(aqi_value),
+                   MIN(aqi_value), COUNT(*)
+            FROM aqi_readings
+            WHERE username = %s AND location = %s
+              AND timestamp >= %s AND timestamp < %s::date + interval '1 day'
+            GROUP BY 1
+            ORDER BY 1
+            """, (bucket, username, location, start_date, end_date))
+            
+            return [
+                {
+                    'timestamp': timestamp,
+                    'aqi': avg_aqi,
+                    'aqi_max': max_aqi,
+                    'aqi_min': min_aqi,
+                    'readings': count
+                }
+                for timestamp, avg_aqi, max_aqi, min_aqi, count in cursor.fetchall()
+            ]
+        
         cursor.execute("""
         SELECT timestamp, aqi_value, pollutants
         FROM aqi_readings
-        WHERE username = %s AND location = %s AND timestamp::date BETWEEN %s AND %s
+        WHERE username = %s AND location = %s
+          AND timestamp >= %s AND timestamp < %s::date + interval '1 day'
         ORDER BY timestamp
         """, (username, location, start_date, end_date))
         
@@ -277,7 +444,7 @@ def get_historical_aqi(conn, username, location, start_date, end_date):
             historical_data.append({
                 'timestamp': timestamp,
                 'aqi': aqi_value,
-                'pollutants': json.loads(pollutants) if pollutants else {}
+                'pollutants': pollutants or {}
             })
             
         return historical_data
@@ -285,6 +452,101 @@ def get_historical_aqi(conn, username, location, start_date, end_date):
         print(f"Error retrieving historical AQI: {e}")
         return []
 
+@pooled
+def get_historical_aqi_bulk(conn, username, locations, start_date, end_date):
+    """
+    Get historical AQI readings for several of a user's locations within a
+    date range in one query; each reading includes its location
+    """
+    if not conn or not locations:
+        return []
+        
+    cursor = conn.cursor()
+    try:
+        cursor.execute("""
+        SELECT location, timestamp, aqi_value, pollutants
+        FROM aqi_readings
+        WHERE username = %s AND location = ANY(%s)
+          AND timestamp >= %s AND timestamp < %s::date + interval '1 day'
+        ORDER BY location, timestamp
+        """, (username, list(locations), start_date, end_date))
+        
+        return [
+            {
+                'location': location,
+                'timestamp': timestamp,
+                'aqi': aqi_value,
+                'pollutants': pollutants or {}
+            }
+            for location, timestamp, aqi_value, pollutants in cursor.fetchall()
+        ]
+    except Exception as e:
+        print(f"Error retrieving historical AQI: {e}")
+        return []
+
+@pooled
+def get_hourly_heatmap(conn, username, location, start_date, end_date):
+    """
+    Get the average AQI for each day and hour of day within a date range,
+    computed in the database; at most 24 rows per day
+    """
+    if not conn:
+        return []
+        
+    cursor = conn.cursor()
+    try:
+        cursor.execute("""
+        SELECT timestamp::date AS day, EXTRACT(hour FROM timestamp)::int AS hour,
+               AVG(aqi_value)
+        FROM aqi_readings
+        WHERE username = %s AND location = %s
+          AND timestamp >= %s AND timestamp < %s::date + interval '1 day'
+        GROUP BY 1, 2
+        ORDER BY 1, 2
+        """, (username, location, start_date, end_date))
+        
+        return [
+            {'date': day, 'hour': hour, 'aqi': avg_aqi}
+            for day, hour, avg_aqi in cursor.fetchall()
+        ]
+    except Exception as e:
+        print(f"Error retrieving AQI heatmap: {e}")
+        return []
+
+@pooled
+def get_aqi_summary(conn, username, location, start_date, end_date):
+    """
+    Get the reading count and average, maximum and minimum AQI for a user
+    and location within a date range, computed in the database
+    """
+    if not conn:
+        return None
+        
+    cursor = conn.cursor()
+    try:
+        cursor.execute("""
+        SELECT COUNT(*), AVG(aqi_value), MAX(aqi_value), MIN(aqi_value)
+        FROM aqi_readings
+        WHERE username = %s AND location = %s
+          AND timestamp >= %s AND timestamp < %s::date + interval '1 day'
+        """, (username, location, start_date, end_date))
+        
+        count, avg_aqi, max_aqi, min_aqi = cursor.fetchone()
+        
+        if not count:
+            return None
+            
+        return {
+            'count': count,
+            'avg': avg_aqi,
+            'max': max_aqi,
+            'min': min_aqi
+        }
+    except Exception as e:
+        print(f"Error retrieving AQI summary: {e}")
+        return None
+
+@pooled
 def get_user_join_date(conn, username):
     """
     Get the date a user joined
@@ -307,6 +569,7 @@ def get_user_join_date(conn, username):
     join_date = result[0]
     return join_date.strftime("%B %d, %Y")
 
+@pooled
 def update_last_login(conn, username):
     """
     Update a user's last login timestamp
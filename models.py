@@ -1,12 +1,129 @@
 import pandas as pd
 import numpy as np
-from sklearn.ensemble import RandomForestRegressor, GradientBoostingRegressor
+from sklearn.ensemble import RandomForestRegressor, HistGradientBoostingRegressor
 from sklearn.model_selection import train_test_split
 from sklearn.preprocessing import StandardScaler
 from sklearn.metrics import mean_squared_error, r2_score
 import joblib
 from datetime import datetime, timedelta
 import os
+from functools import lru_cache
+
+# Model inputs, in column order
+DATETIME_FEATURES = ['day_of_week', 'hour', 'month', 'day',
+                     'day_sin', 'day_cos', 'hour_sin', 'hour_cos']
+LAG_FEATURES = ['aqi_1d_lag', 'aqi_2d_lag', 'aqi_7d_lag']
+FEATURES = DATETIME_FEATURES + LAG_FEATURES
+
+# sin/cos of the day-of-week and hour angles; there are only 7 and 24
+# distinct values, so look them up instead of recomputing them
+_DOW_SIN = np.sin(2 * np.pi * np.arange(7) / 7).astype(np.float32)
+_DOW_COS = np.cos(2 * np.pi * np.arange(7) / 7).astype(np.float32)
+_HOUR_SIN = np.sin(2 * np.pi * np.arange(24) / 24).astype(np.float32)
+_HOUR_COS = np.cos(2 * np.pi * np.arange(24) / 24).astype(np.float32)
+
+def _datetime_features(timestamps, out=None):
+    """
+    Compute the datetime features for naive timestamps in one NumPy pass
+    
+    Args:
+        timestamps (array-like): Timestamps convertible to datetime64
+        out (np.ndarray): Optional (N, 8) array to fill in place
+        
+    Returns:
+        np.ndarray: (N, 8) float32 array with columns in DATETIME_FEATURES order
+    """
+    ts = np.asarray(timestamps, dtype='datetime64[ns]').astype('datetime64[h]')
+    hours = ts.astype(np.int64)
+    months = ts.astype('datetime64[M]')
+    
+    if out is None:
+        out = np.empty((len(ts), len(DATETIME_FEATURES)), dtype=np.float32)
+    
+    day_of_week = (hours // 24 + 3) % 7  # 1970-01-01 was a Thursday (Monday = 0)
+    hour = hours % 24
+    
+    out[:, 0] = day_of_week
+    out[:, 1] = hour
+    out[:, 2] = months.astype(np.int64) % 12 + 1
+    out[:, 3] = (ts.astype('datetime64[D]') - months.astype('datetime64[D]')).astype(np.int64) + 1
+    out[:, 4] = _DOW_SIN[day_of_week]
+    out[:, 5] = _DOW_COS[day_of_week]
+    out[:, 6] = _HOUR_SIN[hour]
+    out[:, 7] = _HOUR_COS[hour]
+    
+    return out
+
+@lru_cache(maxsize=32)
+def _prepare_history(history):
+    """
+    Sort recent readings by time and pick out the values predict starts from
+    
+    Cached, since callers usually pass the same recent history on every rerun.
+    
+    Args:
+        history (tuple): (timestamp, aqi) pairs
+        
+    Returns:
+        tuple: (last_timestamp, last_aqi, second_last_aqi, seventh_last_aqi)
+    """
+    timestamps = pd.to_datetime([timestamp for timestamp, _ in history])
+    aqi = np.array([value for _, value in history], dtype=np.float32)
+    aqi = aqi[np.argsort(timestamps.values, kind='stable')]
+    
+    last_aqi = aqi[-1]
+    second_last_aqi = aqi[-2] if len(aqi) > 1 else last_aqi
+    seventh_last_aqi = aqi[-7] if len(aqi) > 6 else last_aqi
+    
+    return timestamps.max(), last_aqi, second_last_aqi, seventh_last_aqi
+
+def _flatten_forest(forest):
+    """
+    Pack the trees of a fitted RandomForestRegressor into padded arrays with
+    one row per tree, so the whole forest can be evaluated at once
+    
+    Returns:
+        tuple: (feature, threshold, left, right, value, depth)
+    """
+    trees = [estimator.tree_ for estimator in forest.estimators_]
+    shape = (len(trees), max(tree.node_count for tree in trees))
+    
+    feature = np.zeros(shape, dtype=np.intp)
+    threshold = np.zeros(shape, dtype=np.float64)
+    left = np.zeros(shape, dtype=np.intp)
+    right = np.zeros(shape, dtype=np.intp)
+    value = np.zeros(shape, dtype=np.float64)
+    
+    for i, tree in enumerate(trees):
+        n = tree.node_count
+        is_leaf = tree.children_left == -1
+        nodes = np.arange(n)
+        feature[i, :n] = np.where(is_leaf, 0, tree.feature)
+        threshold[i, :n] = tree.threshold
+        # Leaves point at themselves, so extra traversal steps stay put
+        left[i, :n] = np.where(is_leaf, nodes, tree.children_left)
+        right[i, :n] = np.where(is_leaf, nodes, tree.children_right)
+        value[i, :n] = tree.value[:, 0, 0]
+    
+    depth = max(tree.max_depth for tree in trees)
+    return feature, threshold, left, right, value, depth
+
+def _forest_predict(X, flat_forest):
+    """
+    Evaluate a flattened forest on X, stepping every (tree, row) pair down
+    one level per iteration, and average the leaf values over the trees
+    """
+    feature, threshold, left, right, value, depth = flat_forest
+    trees = np.arange(feature.shape[0])[:, None]
+    rows = np.arange(len(X))[None, :]
+    node = np.zeros((feature.shape[0], len(X)), dtype=np.intp)
+    
+    for _ in range(depth):
+        # Same split rule as sklearn: go left when X[feature] <= threshold
+        go_left = X[rows, feature[trees, node]] <= threshold[trees, node]
+        node = np.where(go_left, left[trees, node], right[trees, node])
+    
+    return value[trees, node].mean(axis=0)
 
 class AQIPredictor:
     """
@@ -16,6 +133,11 @@ class AQIPredictor:
         self.model_type = model_type
         self.model = None
         self.scaler = StandardScaler()
+        # Scaler parameters as float32, applied directly in predict
+        self._mean = None
+        self._inv_scale = None
+        # Random forest packed into flat arrays, built on first predict
+        self._flat_forest = None
     
     def train(self, historical_data):
         """
@@ -30,61 +152,58 @@ class AQIPredictor:
         if not historical_data or len(historical_data) < 10:
             return False
         
-        # Create DataFrame from historical data
-        df = pd.DataFrame(historical_data)
-        
-        # Ensure timestamp is datetime
-        if df['timestamp'].dtype != 'datetime64[ns]':
-            df['timestamp'] = pd.to_datetime(df['timestamp'])
+        # Timestamps and AQI as arrays
+        timestamps = pd.to_datetime([row['timestamp'] for row in historical_data])
+        aqi = np.array([row['aqi'] for row in historical_data], dtype=np.float32)
         
         # Extract features from datetime
-        df['day_of_week'] = df['timestamp'].dt.dayofweek
-        df['hour'] = df['timestamp'].dt.hour
-        df['month'] = df['timestamp'].dt.month
-        df['day'] = df['timestamp'].dt.day
-        
-        # Engineer additional features
-        df['day_sin'] = np.sin(2 * np.pi * df['day_of_week']/7)
-        df['day_cos'] = np.cos(2 * np.pi * df['day_of_week']/7)
-        df['hour_sin'] = np.sin(2 * np.pi * df['hour']/24)
-        df['hour_cos'] = np.cos(2 * np.pi * df['hour']/24)
-        
-        # Add lag features (previous day's AQI)
-        df['aqi_1d_lag'] = df['aqi'].shift(1)
-        df['aqi_2d_lag'] = df['aqi'].shift(2)
-        df['aqi_7d_lag'] = df['aqi'].shift(7)
-        
-        # Handle missing values from shifting
-        df = df.dropna()
-        
-        if df.empty or len(df) < 8:
+        datetime_features = _datetime_features(timestamps.to_numpy())
+        
+        # Lag features (previous readings' AQI) by slicing the AQI array. The
+        # first 7 rows have no 7-step lag, so training starts at row 7.
+        X = np.column_stack([
+            datetime_features[7:],
+            aqi[6:-1],
+            aqi[5:-2],
+            aqi[:-7]
+        ])
+        y = aqi[7:]
+        
+        if len(y) < 8:
             return False
         
-        # Select features and target
-        features = ['day_of_week', 'hour', 'month', 'day', 
-                    'day_sin', 'day_cos', 'hour_sin', 'hour_cos',
-                    'aqi_1d_lag', 'aqi_2d_lag', 'aqi_7d_lag']
-        
-        X = df[features]
-        y = df['aqi']
-        
         # Split data
         X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.2, random_state=42)
         
-        # Normalize features
-        X_train_scaled = self.scaler.fit_transform(X_train)
-        X_test_scaled = self.scaler.transform(X_test)
+        # Both model types are tree ensembles, whose splits don't depend on
+        # feature scale, so features are used as-is. The scaler is left
+        # unfitted and only kept so saved models have the same layout.
+        self.scaler = StandardScaler()
+        self._cache_scaler_params()
         
         # Train model
         if self.model_type == 'random_forest':
-            self.model = RandomForestRegressor(n_estimators=100, random_state=42)
+            # Size the forest to the data: on small histories extra or deeper
+            # trees only memorize the samples while making predict slower.
+            # Trees are independent, so build and evaluate them on all cores.
+            n_samples = len(y)
+            self.model = RandomForestRegressor(
+                n_estimators=min(100, max(20, n_samples // 2)),
+                max_depth=min(12, int(np.log2(max(4, n_samples))) + 2),
+                min_samples_leaf=2,
+                random_state=42,
+                n_jobs=-1
+            )
         else:
-            self.model = GradientBoostingRegressor(n_estimators=100, random_state=42)
+            self.model = HistGradientBoostingRegressor(max_iter=100, random_state=42, early_stopping=False)
         
-        self.model.fit(X_train_scaled, y_train)
+        # float32 is the dtype sklearn trees use internally, so fit and
+        # predict don't make upcast copies of the feature matrix
+        self.model.fit(X_train.astype(np.float32, copy=False), y_train)
+        self._flat_forest = None
         
         # Evaluate model
-        y_pred = self.model.predict(X_test_scaled)
+        y_pred = self.model.predict(X_test.astype(np.float32, copy=False))
         mse = mean_squared_error(y_test, y_pred)
         r2 = r2_score(y_test, y_pred)
         
@@ -110,18 +229,9 @@ class AQIPredictor:
         if not historical_data or len(historical_data) < 8:
             return None
         
-        # Create DataFrame from recent data
-        df = pd.DataFrame(historical_data)
-        
-        # Ensure timestamp is datetime
-        if df['timestamp'].dtype != 'datetime64[ns]':
-            df['timestamp'] = pd.to_datetime(df['timestamp'])
-        
-        # Sort by timestamp
-        df = df.sort_values('timestamp')
-        
-        # Get most recent data point
-        last_timestamp = df['timestamp'].max()
+        # Most recent timestamp and lag values from historical data
+        history = tuple((row['timestamp'], row['aqi']) for row in historical_data)
+        last_timestamp, last_aqi, second_last_aqi, seventh_last_aqi = _prepare_history(history)
         
         # Prepare data for forecasting
         forecast_times = []
@@ -129,69 +239,76 @@ class AQIPredictor:
             for hour in range(0, 24, 24 // hours_per_day):
                 forecast_times.append(last_timestamp + timedelta(days=day+1, hours=hour))
         
-        # Create forecast DataFrame
-        forecast_df = pd.DataFrame({'timestamp': forecast_times})
-        
-        # Extract features
-        forecast_df['day_of_week'] = forecast_df['timestamp'].dt.dayofweek
-        forecast_df['hour'] = forecast_df['timestamp'].dt.hour
-        forecast_df['month'] = forecast_df['timestamp'].dt.month
-        forecast_df['day'] = forecast_df['timestamp'].dt.day
-        
-        # Engineer features
-        forecast_df['day_sin'] = np.sin(2 * np.pi * forecast_df['day_of_week']/7)
-        forecast_df['day_cos'] = np.cos(2 * np.pi * forecast_df['day_of_week']/7)
-        forecast_df['hour_sin'] = np.sin(2 * np.pi * forecast_df['hour']/24)
-        forecast_df['hour_cos'] = np.cos(2 * np.pi * forecast_df['hour']/24)
-        
-        # Get lag values from historical data
-        last_aqi = df['aqi'].iloc[-1]
-        second_last_aqi = df['aqi'].iloc[-2] if len(df) > 1 else last_aqi
-        seventh_last_aqi = df['aqi'].iloc[-7] if len(df) > 6 else last_aqi
-        
-        # Initialize with historical values
-        forecast_df['aqi_1d_lag'] = last_aqi
-        forecast_df['aqi_2d_lag'] = second_last_aqi
-        forecast_df['aqi_7d_lag'] = seventh_last_aqi
-        
-        # Select features
-        features = ['day_of_week', 'hour', 'month', 'day', 
-                   'day_sin', 'day_cos', 'hour_sin', 'hour_cos',
-                   'aqi_1d_lag', 'aqi_2d_lag', 'aqi_7d_lag']
-        
-        # Make predictions step by step
+        # Build the feature matrix for every forecast step once; only the
+        # lag columns change as predictions are made
+        X_all = np.empty((len(forecast_times), len(FEATURES)), dtype=np.float32)
+        _datetime_features(pd.DatetimeIndex(forecast_times).to_numpy(), out=X_all[:, :len(DATETIME_FEATURES)])
+        n_steps = len(forecast_times)
+        
+        # Current 1-day, 2-day and 7-day lags, starting from history and
+        # updated from predictions at day boundaries
+        lags = np.array([last_aqi, second_last_aqi, seventh_last_aqi], dtype=np.float32)
+        
         predictions = []
-        current_df = forecast_df.copy()
         
-        # Predict each time step
-        for i in range(len(forecast_times)):
-            # Get features for current prediction
-            X = current_df.iloc[i:i+1][features]
+        # Lags only change every hours_per_day steps, so each such block of
+        # steps is predicted with a single call
+        for start in range(0, n_steps, hours_per_day):
+            end = min(start + hours_per_day, n_steps)
+            block = X_all[start:end]
+            block[:, len(DATETIME_FEATURES):] = lags
             
-            # Scale features
-            X_scaled = self.scaler.transform(X)
+            # Models saved before scaling was dropped expect scaled features
+            if self._mean is not None:
+                block = (block - self._mean) * self._inv_scale
             
-            # Make prediction
-            pred = self.model.predict(X_scaled)[0]
-            pred = max(0, pred)  # Ensure non-negative AQI
+            # Predict the whole block
+            preds = np.maximum(self._predict_block(block), 0)  # Ensure non-negative AQI
             
-            # Store prediction
-            predictions.append({
-                'timestamp': forecast_times[i].isoformat(),
-                'aqi': round(pred, 1)
-            })
+            # Store predictions
+            for i, pred in enumerate(preds, start):
+                predictions.append({
+                    'timestamp': forecast_times[i].isoformat(),
+                    'aqi': round(float(pred), 1)
+                })
             
-            # Update lag values for next prediction
-            if i+1 < len(forecast_times):
-                if (i+1) % hours_per_day == 0:  # New day
-                    current_df.loc[i+1:, 'aqi_1d_lag'] = pred
-                if (i+1) % (hours_per_day*2) == 0:  # Every 2 days
-                    current_df.loc[i+1:, 'aqi_2d_lag'] = pred
-                if (i+1) % (hours_per_day*7) == 0:  # Every 7 days
-                    current_df.loc[i+1:, 'aqi_7d_lag'] = pred
+            # Update lag values for the next block
+            pred = preds[-1]
+            lags[0] = pred  # New day
+            if end % (hours_per_day*2) == 0:  # Every 2 days
+                lags[1] = pred
+            if end % (hours_per_day*7) == 0:  # Every 7 days
+                lags[2] = pred
         
         return predictions
     
+    def _predict_block(self, X):
+        """
+        Predict a block of rows, evaluating random forests from their
+        flattened arrays rather than through sklearn's per-call machinery
+        """
+        if not isinstance(self.model, RandomForestRegressor):
+            return self.model.predict(X)
+        
+        if self._flat_forest is None:
+            self._flat_forest = _flatten_forest(self.model)
+        return _forest_predict(X, self._flat_forest)
+    
+    def _cache_scaler_params(self):
+        """
+        Keep the fitted scaler's mean and inverse scale as float32 arrays so
+        predict can scale features without going through scaler.transform
+        
+        Both stay None when the scaler was not fitted, meaning no scaling.
+        """
+        if not hasattr(self.scaler, 'mean_'):
+            self._mean = None
+            self._inv_scale = None
+            return
+        
+        self._mean = self.scaler.mean_.astype(np.float32)
+        self._inv_scale = (1.0 / self.scaler.scale_).astype(np.float32)
+    
     def save_model(self, path='aqi_model.joblib'):
         """
         Save the trained model to a file
@@ -203,9 +320,12 @@ class AQIPredictor:
             model_data = {
                 'model': self.model,
                 'scaler': self.scaler,
+                'mean': self._mean,
+                'inv_scale': self._inv_scale,
                 'model_type': self.model_type
             }
-            joblib.dump(model_data, path)
+            # Uncompressed so load_model can memory-map the arrays
+            joblib.dump(model_data, path, compress=0)
             return True
         except Exception as e:
             print(f"Error saving model: {e}")
@@ -219,10 +339,24 @@ class AQIPredictor:
             if not os.path.exists(path):
                 return False
                 
-            model_data = joblib.load(path)
+            # Map the arrays read-only so the OS pages them in on demand and
+            # shares them between processes loading the same file
+            model_data = joblib.load(path, mmap_mode='r')
             self.model = model_data['model']
             self.scaler = model_data['scaler']
             self.model_type = model_data['model_type']
+            self._flat_forest = None
+            
+            # A saved forest keeps the n_jobs it was trained with
+            if isinstance(self.model, RandomForestRegressor):
+                self.model.n_jobs = -1
+            
+            # Files saved before the cached parameters existed only have the scaler
+            if model_data.get('mean') is not None:
+                self._mean = model_data['mean']
+                self._inv_scale = model_data['inv_scale']
+            else:
+                self._cache_scaler_params()
             return True
         except Exception as e:
             print(f"Error loading model: {e}")
@@ -1,20 +1,49 @@
 import streamlit as st
 import pandas as pd
+import numpy as np
 import plotly.express as px
 import plotly.graph_objects as go
 from datetime import datetime, timedelta
+import time
 
-import sys
-import os
-
-# Add parent directory to path
-sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
-
-import data
+import cached
 import utils
 import database
 from recommendations import get_recommendations
 
+# AQI category bands and labels shaded on the historical trend
+AQI_ZONES = (
+    (0, 50, "green"),
+    (50, 100, "yellow"),
+    (100, 150, "orange"),
+    (150, 200, "red"),
+    (200, 300, "purple"),
+    (300, 500, "maroon"),
+)
+AQI_ZONE_LABELS = (
+    (25, "Good"),
+    (75, "Moderate"),
+    (125, "Unhealthy for Sensitive Groups"),
+    (175, "Unhealthy"),
+    (250, "Very Unhealthy"),
+    (400, "Hazardous"),
+)
+
+# Pollutant card colors by upper bound; real thresholds would be pollutant-specific
+POLLUTANT_COLORS = ('#4CAF50', '#FFEB3B', '#FF9800', '#F44336')  # Green, yellow, orange, red
+POLLUTANT_THRESHOLDS = {
+    'PM2.5': np.array([12, 35.4, 55.4]),
+    'PM10': np.array([54, 154, 254]),
+}
+DEFAULT_POLLUTANT_THRESHOLDS = np.array([50, 100, 150])
+
+def pollutant_color(pollutant, value):
+    """
+    Card color for a pollutant concentration
+    """
+    thresholds = POLLUTANT_THRESHOLDS.get(pollutant, DEFAULT_POLLUTANT_THRESHOLDS)
+    return POLLUTANT_COLORS[int(np.searchsorted(thresholds, value))]
+
 # Page configuration
 st.set_page_config(
     page_title="AirQual - Dashboard",
@@ -39,6 +68,40 @@ if not st.session_state.authenticated:
 # Get database connection
 conn = database.get_connection()
 
+@st.cache_data(ttl=300, show_spinner=False)
+def _load_history(username, location, start_date, end_date):
+    """
+    Hourly AQI averages, extremes and reading counts as a DataFrame with
+    typed columns
+    """
+    rows = database.get_historical_aqi(
+        database.get_connection(),
+        username,
+        location,
+        start_date,
+        end_date,
+        bucket='hour'
+    )
+    
+    # Build each column with its final dtype so no to_datetime pass is needed
+    count = len(rows)
+    return pd.DataFrame({
+        'timestamp': np.array([row['timestamp'] for row in rows], dtype='datetime64[ns]'),
+        'aqi': np.fromiter((row['aqi'] for row in rows), dtype=np.float64, count=count),
+        'aqi_max': np.fromiter((row['aqi_max'] for row in rows), dtype=np.float64, count=count),
+        'aqi_min': np.fromiter((row['aqi_min'] for row in rows), dtype=np.float64, count=count),
+        'readings': np.fromiter((row['readings'] for row in rows), dtype=np.int64, count=count)
+    })
+
+def _refresh_when_due():
+    """
+    Rerun the whole dashboard once the auto-refresh interval has passed;
+    called from a fragment that ticks on that interval
+    """
+    # Allow a second of slack for the timer firing just before the deadline
+    if time.time() >= st.session_state.get('refresh_due', 0) - 1:
+        st.rerun()
+
 # Sidebar for location selection
 with st.sidebar:
     st.title("🌬️ AirQual")
@@ -79,12 +142,15 @@ st.title(f"Air Quality Dashboard for {st.session_state.location}")
 
 # Fetch current AQI data
 with st.spinner("Fetching air quality data..."):
-    aqi_data = data.get_current_aqi(st.session_state.location)
+    aqi_data = cached.current_aqi(st.session_state.location)
 
 if aqi_data:
     # Store current AQI in session state
     st.session_state.current_aqi = aqi_data
     
+    if aqi_data.get('stale'):
+        st.warning("The air quality service is unavailable right now. Showing the last known reading.")
+    
     # Display current AQI in a prominent box
     aqi_value = aqi_data.get('aqi', 0)
     aqi_category, aqi_color = utils.get_aqi_category(aqi_value)
@@ -132,12 +198,14 @@ if aqi_data:
             if st.button("📌 Save Location"):
                 st.session_state.locations.append(st.session_state.location)
                 database.update_user_locations(conn, st.session_state.username, st.session_state.locations)
+                cached.user_data.clear()
                 st.success(f"{st.session_state.location} saved to your locations")
                 st.rerun()
         else:
             if st.button("❌ Remove Location"):
                 st.session_state.locations.remove(st.session_state.location)
                 database.update_user_locations(conn, st.session_state.username, st.session_state.locations)
+                cached.user_data.clear()
                 st.success(f"{st.session_state.location} removed from your locations")
                 st.rerun()
     
@@ -159,78 +227,35 @@ if aqi_data:
             
             formatted_pollutants[display_name] = value
         
-        # Create columns for each pollutant
-        cols = st.columns(len(formatted_pollutants))
-        
-        for i, (pollutant, value) in enumerate(formatted_pollutants.items()):
-            with cols[i]:
-                # Determine color based on pollutant level
-                # This is a simplified approach - real thresholds would be pollutant-specific
-                if pollutant == 'PM2.5':
-                    if value <= 12:
-                        color = '#4CAF50'  # Green
-                    elif value <= 35.4:
-                        color = '#FFEB3B'  # Yellow
-                    elif value <= 55.4:
-                        color = '#FF9800'  # Orange
-                    else:
-                        color = '#F44336'  # Red
-                elif pollutant == 'PM10':
-                    if value <= 54:
-                        color = '#4CAF50'  # Green
-                    elif value <= 154:
-                        color = '#FFEB3B'  # Yellow
-                    elif value <= 254:
-                        color = '#FF9800'  # Orange
-                    else:
-                        color = '#F44336'  # Red
-                else:
-                    # Generic coloring for other pollutants
-                    if value <= 50:
-                        color = '#4CAF50'  # Green
-                    elif value <= 100:
-                        color = '#FFEB3B'  # Yellow
-                    elif value <= 150:
-                        color = '#FF9800'  # Orange
-                    else:
-                        color = '#F44336'  # Red
-                
-                st.markdown(
-                    f"""
-                    <div style="background-color:{color};padding:10px;border-radius:5px;text-align:center;">
-                        <h4 style="color:white;margin:0;">{pollutant}</h4>
-                        <h2 style="color:white;margin:0;">{value}</h2>
-                        <p style="color:white;margin:0;">μg/m³</p>
-                    </div>
-                    """,
-                    unsafe_allow_html=True
-                )
+        # Render all pollutant cards as one flex row; each card is built on a
+        # single line so markdown doesn't end the HTML block early
+        cards = "".join(
+            f'<div style="flex:1;background-color:{pollutant_color(pollutant, value)};padding:10px;border-radius:5px;text-align:center;">'
+            f'<h4 style="color:white;margin:0;">{pollutant}</h4>'
+            f'<h2 style="color:white;margin:0;">{value}</h2>'
+            f'<p style="color:white;margin:0;">μg/m³</p>'
+            '</div>'
+            for pollutant, value in formatted_pollutants.items()
+        )
+        st.markdown(f'<div style="display:flex;gap:1rem;">{cards}</div>', unsafe_allow_html=True)
     else:
         st.info("Detailed pollutant data not available for this location")
     
     # Historical data trend
     st.subheader("Historical AQI Trend")
     
-    # Fetch historical data
-    end_date = datetime.now()
+    # Fetch historical data; whole days keep the cache key stable across reruns
+    end_date = datetime.now().date()
     start_date = end_date - timedelta(days=days_back)
     
-    historical_data = database.get_historical_aqi(
-        conn, 
-        st.session_state.username, 
+    df = _load_history(
+        st.session_state.username,
         st.session_state.location,
         start_date,
         end_date
     )
     
-    if historical_data:
-        # Convert to DataFrame for plotting
-        df = pd.DataFrame(historical_data)
-        
-        # Ensure datetime format
-        if 'timestamp' in df.columns and df['timestamp'].dtype != 'datetime64[ns]':
-            df['timestamp'] = pd.to_datetime(df['timestamp'])
-        
+    if not df.empty:
         # Create line chart
         fig = px.line(
             df, 
@@ -241,21 +266,19 @@ if aqi_data:
             markers=True
         )
         
-        # Add color zones for AQI categories
-        fig.add_hrect(y0=0, y1=50, line_width=0, fillcolor="green", opacity=0.1)
-        fig.add_hrect(y0=50, y1=100, line_width=0, fillcolor="yellow", opacity=0.1)
-        fig.add_hrect(y0=100, y1=150, line_width=0, fillcolor="orange", opacity=0.1)
-        fig.add_hrect(y0=150, y1=200, line_width=0, fillcolor="red", opacity=0.1)
-        fig.add_hrect(y0=200, y1=300, line_width=0, fillcolor="purple", opacity=0.1)
-        fig.add_hrect(y0=300, y1=500, line_width=0, fillcolor="maroon", opacity=0.1)
-        
-        # Add text annotations for categories
-        fig.add_annotation(x=df['timestamp'].min(), y=25, text="Good", showarrow=False, xanchor="left")
-        fig.add_annotation(x=df['timestamp'].min(), y=75, text="Moderate", showarrow=False, xanchor="left")
-        fig.add_annotation(x=df['timestamp'].min(), y=125, text="Unhealthy for Sensitive Groups", showarrow=False, xanchor="left")
-        fig.add_annotation(x=df['timestamp'].min(), y=175, text="Unhealthy", showarrow=False, xanchor="left")
-        fig.add_annotation(x=df['timestamp'].min(), y=250, text="Very Unhealthy", showarrow=False, xanchor="left")
-        fig.add_annotation(x=df['timestamp'].min(), y=400, text="Hazardous", showarrow=False, xanchor="left")
+        # Add color zones and category labels in one layout update
+        xmin = df['timestamp'].min()
+        fig.update_layout(
+            shapes=[
+                dict(type='rect', xref='paper', x0=0, x1=1, y0=y0, y1=y1,
+                     fillcolor=color, opacity=0.1, line_width=0)
+                for y0, y1, color in AQI_ZONES
+            ],
+            annotations=[
+                dict(x=xmin, y=y, text=text, showarrow=False, xanchor="left")
+                for y, text in AQI_ZONE_LABELS
+            ]
+        )
         
         st.plotly_chart(fig, use_container_width=True)
         
@@ -265,13 +288,14 @@ if aqi_data:
         col1, col2, col3, col4 = st.columns(4)
         
         with col1:
-            st.metric("Average AQI", round(df['aqi'].mean(), 1))
+            # Weight the hourly averages by their reading counts
+            st.metric("Average AQI", round(np.average(df['aqi'], weights=df['readings']), 1))
         
         with col2:
-            st.metric("Maximum AQI", df['aqi'].max())
+            st.metric("Maximum AQI", df['aqi_max'].max())
         
         with col3:
-            st.metric("Minimum AQI", df['aqi'].min())
+            st.metric("Minimum AQI", df['aqi_min'].min())
         
         with col4:
             # Calculate AQI trend (improving or worsening)
@@ -292,19 +316,18 @@ if aqi_data:
     else:
         st.info(f"No historical data available for {st.session_state.location}. Visit this dashboard regularly to build up historical data.")
     
-    # Save AQI data to database for history
-    database.save_aqi_reading(conn, st.session_state.username, st.session_state.location, aqi_value, aqi_data)
-    
-    # Auto-refresh logic
-    if auto_refresh:
-        st.markdown(f"<p>Dashboard will refresh in {refresh_interval} minutes</p>", unsafe_allow_html=True)
-        st.markdown("""
-        <script>
-            setTimeout(function() {
-                window.location.reload();
-            }, %s);
-        </script>
-        """ % (refresh_interval * 60 * 1000), unsafe_allow_html=True)
+    # Save AQI data to database for history, unless it is an old reading
+    # served while the API is down
+    if not aqi_data.get('stale'):
+        database.save_aqi_reading(conn, st.session_state.username, st.session_state.location, aqi_value, aqi_data)
 
 else:
     st.error("Failed to fetch air quality data. Please check the location name or try again later.")
+
+# Auto-refresh logic: a timer fragment reruns the script over the open
+# websocket instead of reloading the page. It runs after a failed fetch
+# too, so the next tick retries.
+if auto_refresh:
+    st.markdown(f"<p>Dashboard will refresh in {refresh_interval} minutes</p>", unsafe_allow_html=True)
+    st.session_state.refresh_due = time.time() + refresh_interval * 60
+    st.fragment(run_every=timedelta(minutes=refresh_interval))(_refresh_when_due)()
@@ -1,18 +1,31 @@
 import streamlit as st
 import pandas as pd
+import numpy as np
 import plotly.express as px
 import plotly.graph_objects as go
-from datetime import datetime, timedelta
-
-import sys
-import os
-
-# Add parent directory to path
-sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from datetime import date, datetime, timedelta
 
 import database
 import utils
-from utils import get_aqi_category
+
+# Most points drawn in the line chart; longer series are downsampled
+MAX_CHART_POINTS = 1500
+
+# Raw readings added to the data table per "Show more"
+RAW_DATA_PAGE_ROWS = 500
+
+# AQI category bands: (low, high, zone color, name, label height)
+AQI_BANDS = (
+    (0, 50, "green", "Good", 25),
+    (50, 100, "yellow", "Moderate", 75),
+    (100, 150, "orange", "Unhealthy for Sensitive Groups", 125),
+    (150, 200, "red", "Unhealthy", 175),
+    (200, 300, "purple", "Very Unhealthy", 250),
+    (300, 500, "maroon", "Hazardous", 400),
+)
+
+# Columns written to the CSV download
+CSV_COLUMNS = ['timestamp', 'aqi', 'pollutants', 'category', 'color']
 
 # Page configuration
 st.set_page_config(
@@ -38,6 +51,192 @@ if not st.session_state.authenticated:
 # Get database connection
 conn = database.get_connection()
 
+@st.cache_data(ttl=300, show_spinner="Fetching historical data...")
+def _fetch_hist(username, location, start_date, end_date):
+    """
+    Historical AQI readings for a date range as a DataFrame with parsed
+    timestamps, dates and categories, reused across reruns that only change
+    how the data is displayed
+    """
+    df = pd.DataFrame(database.get_historical_aqi(
+        database.get_connection(),
+        username,
+        location,
+        start_date,
+        end_date
+    ))
+    if df.empty:
+        return df
+    
+    # Ensure timestamp is datetime
+    if df['timestamp'].dtype != 'datetime64[ns]':
+        df['timestamp'] = pd.to_datetime(df['timestamp'])
+    
+    # float32 is plenty for AQI values and halves the data moved into plots
+    df['aqi'] = df['aqi'].astype(np.float32)
+    
+    # Add date and category information; categories are ordered by severity
+    df['date'] = df['timestamp'].dt.date
+    df['category'] = utils.get_aqi_categories(df['aqi'])
+    df['color'] = df['category'].map(utils.AQI_CATEGORY_COLORS)
+    return df
+
+@st.cache_data(ttl=300, show_spinner=False)
+def _csv_bytes(username, location, start_date, end_date):
+    """
+    Readings for a date range encoded as CSV for the download button
+    """
+    df = _fetch_hist(username, location, start_date, end_date)
+    return df[CSV_COLUMNS].to_csv(index=False).encode('utf-8')
+
+@st.cache_data(ttl=300, show_spinner=False)
+def _fetch_heatmap(username, location, start_date, end_date):
+    """
+    Average AQI per day and hour of day for the heat map
+    """
+    return database.get_hourly_heatmap(
+        database.get_connection(),
+        username,
+        location,
+        start_date,
+        end_date
+    )
+
+@st.cache_data(show_spinner=False)
+def _trend(timestamps_ns, aqi):
+    """
+    Quadratic trend of AQI over time, evaluated at each reading
+    """
+    # Fit against days since the first reading; raw nanoseconds are too
+    # large for a well-conditioned polynomial fit
+    days = (timestamps_ns - timestamps_ns[0]) / 86_400e9
+    return np.polyval(np.polyfit(days, aqi, 2), days)
+
+@st.fragment
+def _render_trend_chart(df, start_date, end_date):
+    """
+    Chart options and the AQI trend chart. Changing an option only reruns
+    this fragment, not the data loading and statistics above it.
+    """
+    st.subheader("AQI Trend Over Time")
+    
+    # Visualization options
+    col1, col2, col3 = st.columns([2, 1, 1])
+    with col1:
+        chart_type = st.selectbox(
+            "Chart type",
+            options=["Line chart", "Bar chart", "Heat map"]
+        )
+    with col2:
+        show_trends = st.checkbox("Show trends", value=True)
+    with col3:
+        show_categories = st.checkbox("Show AQI categories", value=True)
+    
+    if chart_type == "Line chart":
+        # Long ranges are downsampled so the browser isn't sent every reading
+        keep = utils.lttb_indices(df['timestamp'].to_numpy().astype('int64'), df['aqi'].to_numpy(), MAX_CHART_POINTS)
+        fig = px.line(
+            df.iloc[keep], 
+            x='timestamp', 
+            y='aqi',
+            labels={'timestamp': 'Date', 'aqi': 'AQI Value'},
+            markers=True,
+            render_mode='webgl'
+        )
+        
+        # Add trendline if requested
+        if show_trends and len(df) > 3:
+            trend = _trend(df['timestamp'].to_numpy().astype('int64'), df['aqi'].to_numpy())
+            fig.add_scatter(x=df['timestamp'].iloc[keep], y=trend[keep], mode='lines', name='Trend')
+        
+        # Add category zones and labels if requested, in one layout update
+        if show_categories:
+            xmin = df['timestamp'].min()
+            fig.update_layout(
+                shapes=[
+                    dict(type='rect', xref='paper', x0=0, x1=1, y0=low, y1=high,
+                         fillcolor=color, opacity=0.1, line_width=0)
+                    for low, high, color, _, _ in AQI_BANDS
+                ],
+                annotations=[
+                    dict(x=xmin, y=label_y, text=name, showarrow=False, xanchor="left")
+                    for _, _, _, name, label_y in AQI_BANDS
+                ]
+            )
+        
+    elif chart_type == "Bar chart":
+        # Aggregate by day for bar chart
+        daily_avg = df.groupby('date')['aqi'].mean().reset_index()
+        daily_avg['category'] = utils.get_aqi_categories(daily_avg['aqi'])
+        daily_avg['color'] = daily_avg['category'].map(utils.AQI_CATEGORY_COLORS)
+        
+        fig = px.bar(
+            daily_avg,
+            x='date',
+            y='aqi',
+            color='category',
+            color_discrete_map=utils.AQI_CATEGORY_COLORS,
+            labels={'date': 'Date', 'aqi': 'Average Daily AQI'}
+        )
+        
+        # Add reference lines for AQI categories
+        if show_categories:
+            fig.update_layout(shapes=[
+                dict(type='line', xref='paper', x0=0, x1=1, y0=high, y1=high,
+                     line=dict(color=color, dash='dash'), opacity=0.7)
+                for _, high, color, _, _ in AQI_BANDS[:-1]
+            ])
+    
+    elif chart_type == "Heat map":
+        # Create a heatmap of AQI by day and hour
+        if len(df) >= 24:  # Need at least a day of data
+            # Day by hour averages are aggregated in the database
+            pivot = pd.DataFrame(_fetch_heatmap(
+                st.session_state.username,
+                st.session_state.location,
+                start_date,
+                end_date
+            )).pivot(
+                index='date', 
+                columns='hour', 
+                values='aqi'
+            ).reindex(columns=range(24)).fillna(0)
+            
+            # Create heatmap
+            fig = px.imshow(
+                pivot,
+                labels={'x': 'Hour of Day', 'y': 'Date', 'color': 'AQI'},
+                x=[str(h) for h in range(24)],
+                color_continuous_scale=[
+                    '#4CAF50',  # Green
+                    '#FFEB3B',  # Yellow
+                    '#FF9800',  # Orange
+                    '#F44336',  # Red
+                    '#9C27B0',  # Purple
+                    '#800000'   # Maroon
+                ],
+                aspect="auto"
+            )
+            
+            fig.update_layout(
+                xaxis_title="Hour of Day",
+                yaxis_title="Date"
+            )
+        else:
+            st.warning("Not enough data for a heatmap view. Try a different chart type or date range.")
+            # Fall back to line chart
+            fig = px.line(
+                df, 
+                x='timestamp', 
+                y='aqi',
+                labels={'timestamp': 'Date', 'aqi': 'AQI Value'},
+                markers=True,
+                render_mode='webgl'
+            )
+    
+    # Display the chart
+    st.plotly_chart(fig, use_container_width=True)
+
 # Sidebar
 with st.sidebar:
     st.title("🌬️ AirQual")
@@ -73,30 +272,20 @@ with st.sidebar:
     )
     
     if preset == "Last 7 days":
-        start_date = datetime.now() - timedelta(days=7)
-        end_date = datetime.now()
+        start_date = date.today() - timedelta(days=7)
+        end_date = date.today()
     elif preset == "Last 30 days":
-        start_date = datetime.now() - timedelta(days=30)
-        end_date = datetime.now()
+        start_date = date.today() - timedelta(days=30)
+        end_date = date.today()
     elif preset == "Last 3 months":
-        start_date = datetime.now() - timedelta(days=90)
-        end_date = datetime.now()
+        start_date = date.today() - timedelta(days=90)
+        end_date = date.today()
     else:  # Custom range
         col1, col2 = st.columns(2)
         with col1:
             start_date = st.date_input("Start date", datetime.now() - timedelta(days=30))
         with col2:
             end_date = st.date_input("End date", datetime.now())
-    
-    # Visualization options
-    st.subheader("Visualization Options")
-    chart_type = st.selectbox(
-        "Chart type",
-        options=["Line chart", "Bar chart", "Heat map"]
-    )
-    
-    show_trends = st.checkbox("Show trends", value=True)
-    show_categories = st.checkbox("Show AQI categories", value=True)
 
 # Main content
 st.title(f"Historical Air Quality Data: {st.session_state.location}")
@@ -106,17 +295,15 @@ if start_date > end_date:
     st.error("Start date cannot be after end date")
     st.stop()
 
-# Fetch historical data
-with st.spinner("Fetching historical data..."):
-    historical_data = database.get_historical_aqi(
-        conn, 
-        st.session_state.username, 
-        st.session_state.location,
-        start_date,
-        end_date
-    )
+# Fetch historical data; presets use whole days so the cache key is stable
+df = _fetch_hist(
+    st.session_state.username,
+    st.session_state.location,
+    start_date,
+    end_date
+)
 
-if not historical_data:
+if df.empty:
     st.info(f"No historical data available for {st.session_state.location} in the selected date range.")
     
     # Options to generate data
@@ -127,18 +314,10 @@ if not historical_data:
     if st.button("Go to Dashboard"):
         st.switch_page("pages/dashboard.py")
 else:
-    # Convert to DataFrame for analysis
-    df = pd.DataFrame(historical_data)
-    
-    # Ensure timestamp is datetime
-    if 'timestamp' in df.columns and df['timestamp'].dtype != 'datetime64[ns]':
-        df['timestamp'] = pd.to_datetime(df['timestamp'])
-    
-    # Add category information
-    df['category'] = df['aqi'].apply(lambda x: get_aqi_category(x)[0])
-    df['color'] = df['aqi'].apply(lambda x: get_aqi_category(x)[1])
+    # Counts in AQI severity order, shared by the summary and the breakdown
+    counts = df['category'].value_counts().reindex(utils.AQI_CATEGORIES, fill_value=0)
     
-    # Summary statistics
+    # Summary statistics from the cached readings, so no extra query is needed
     st.subheader("Summary Statistics")
     
     col1, col2, col3, col4 = st.columns(4)
@@ -154,160 +333,25 @@ else:
     
     with col4:
         # Most frequent category
-        category_counts = df['category'].value_counts()
-        most_common_category = category_counts.index[0]
-        st.metric("Most Common", most_common_category)
+        st.metric("Most Common", counts.idxmax())
     
     # Main visualization
-    st.subheader("AQI Trend Over Time")
-    
-    if chart_type == "Line chart":
-        fig = px.line(
-            df, 
-            x='timestamp', 
-            y='aqi',
-            labels={'timestamp': 'Date', 'aqi': 'AQI Value'},
-            markers=True
-        )
-        
-        # Add trendline if requested
-        if show_trends and len(df) > 3:
-            fig.add_trace(
-                px.scatter(df, x='timestamp', y='aqi', trendline="lowess").data[1]
-            )
-        
-        # Add category zones if requested
-        if show_categories:
-            fig.add_hrect(y0=0, y1=50, line_width=0, fillcolor="green", opacity=0.1)
-            fig.add_hrect(y0=50, y1=100, line_width=0, fillcolor="yellow", opacity=0.1)
-            fig.add_hrect(y0=100, y1=150, line_width=0, fillcolor="orange", opacity=0.1)
-            fig.add_hrect(y0=150, y1=200, line_width=0, fillcolor="red", opacity=0.1)
-            fig.add_hrect(y0=200, y1=300, line_width=0, fillcolor="purple", opacity=0.1)
-            fig.add_hrect(y0=300, y1=500, line_width=0, fillcolor="maroon", opacity=0.1)
-            
-            # Add category labels
-            fig.add_annotation(x=df['timestamp'].min(), y=25, text="Good", showarrow=False, xanchor="left")
-            fig.add_annotation(x=df['timestamp'].min(), y=75, text="Moderate", showarrow=False, xanchor="left")
-            fig.add_annotation(x=df['timestamp'].min(), y=125, text="Unhealthy for Sensitive Groups", showarrow=False, xanchor="left")
-            fig.add_annotation(x=df['timestamp'].min(), y=175, text="Unhealthy", showarrow=False, xanchor="left")
-            fig.add_annotation(x=df['timestamp'].min(), y=250, text="Very Unhealthy", showarrow=False, xanchor="left")
-            fig.add_annotation(x=df['timestamp'].min(), y=400, text="Hazardous", showarrow=False, xanchor="left")
-        
-    elif chart_type == "Bar chart":
-        # Aggregate by day for bar chart
-        df['date'] = df['timestamp'].dt.date
-        daily_avg = df.groupby('date')['aqi'].mean().reset_index()
-        daily_avg['category'] = daily_avg['aqi'].apply(lambda x: get_aqi_category(x)[0])
-        daily_avg['color'] = daily_avg['aqi'].apply(lambda x: get_aqi_category(x)[1])
-        
-        fig = px.bar(
-            daily_avg,
-            x='date',
-            y='aqi',
-            color='category',
-            color_discrete_map={
-                'Good': '#4CAF50',
-                'Moderate': '#FFEB3B',
-                'Unhealthy for Sensitive Groups': '#FF9800',
-                'Unhealthy': '#F44336',
-                'Very Unhealthy': '#9C27B0',
-                'Hazardous': '#800000'
-            },
-            labels={'date': 'Date', 'aqi': 'Average Daily AQI'}
-        )
-        
-        # Add reference lines for AQI categories
-        if show_categories:
-            fig.add_hline(y=50, line_dash="dash", line_color="green", opacity=0.7)
-            fig.add_hline(y=100, line_dash="dash", line_color="yellow", opacity=0.7)
-            fig.add_hline(y=150, line_dash="dash", line_color="orange", opacity=0.7)
-            fig.add_hline(y=200, line_dash="dash", line_color="red", opacity=0.7)
-            fig.add_hline(y=300, line_dash="dash", line_color="purple", opacity=0.7)
-    
-    elif chart_type == "Heat map":
-        # Create a heatmap of AQI by day and hour
-        if len(df) >= 24:  # Need at least a day of data
-            df['date'] = df['timestamp'].dt.date
-            df['hour'] = df['timestamp'].dt.hour
-            
-            # Create pivot table
-            pivot = df.pivot_table(
-                index='date', 
-                columns='hour', 
-                values='aqi', 
-                aggfunc='mean'
-            ).fillna(0)
-            
-            # Create heatmap
-            fig = px.imshow(
-                pivot,
-                labels={'x': 'Hour of Day', 'y': 'Date', 'color': 'AQI'},
-                x=[str(h) for h in range(24)],
-                color_continuous_scale=[
-                    '#4CAF50',  # Green
-                    '#FFEB3B',  # Yellow
-                    '#FF9800',  # Orange
-                    '#F44336',  # Red
-                    '#9C27B0',  # Purple
-                    '#800000'   # Maroon
-                ],
-                aspect="auto"
-            )
-            
-            fig.update_layout(
-                xaxis_title="Hour of Day",
-                yaxis_title="Date"
-            )
-        else:
-            st.warning("Not enough data for a heatmap view. Try a different chart type or date range.")
-            # Fall back to line chart
-            fig = px.line(
-                df, 
-                x='timestamp', 
-                y='aqi',
-                labels={'timestamp': 'Date', 'aqi': 'AQI Value'},
-                markers=True
-            )
-    
-    # Display the chart
-    st.plotly_chart(fig, use_container_width=True)
+    _render_trend_chart(df, start_date, end_date)
     
     # Add data breakdown section
     with st.expander("Data Breakdown"):
         # AQI category distribution
         st.subheader("AQI Category Distribution")
         
-        category_counts = df['category'].value_counts().reset_index()
-        category_counts.columns = ['Category', 'Count']
+        # Skip categories with no readings
+        counts = counts[counts > 0]
+        ordered_df = pd.DataFrame({
+            'Category': counts.index,
+            'Count': counts.to_numpy(),
+            'Percentage': (counts.to_numpy() / len(df) * 100).round(1)
+        })
         
-        # Calculate percentages
-        total_readings = len(df)
-        category_counts['Percentage'] = (category_counts['Count'] / total_readings * 100).round(1)
-        
-        # Order categories by AQI severity
-        category_order = [
-            'Good', 
-            'Moderate', 
-            'Unhealthy for Sensitive Groups', 
-            'Unhealthy', 
-            'Very Unhealthy', 
-            'Hazardous'
-        ]
-        
-        # Create ordered DataFrame
-        ordered_cats = []
-        for cat in category_order:
-            if cat in category_counts['Category'].values:
-                cat_data = category_counts[category_counts['Category'] == cat].iloc[0]
-                ordered_cats.append({
-                    'Category': cat,
-                    'Count': cat_data['Count'],
-                    'Percentage': cat_data['Percentage']
-                })
-        
-        if ordered_cats:
-            ordered_df = pd.DataFrame(ordered_cats)
-            
+        if not ordered_df.empty:
             # Display as pie chart
             fig = px.pie(
                 ordered_df,
@@ -315,14 +359,7 @@ else:
                 names='Category',
                 title="AQI Category Distribution",
                 color='Category',
-                color_discrete_map={
-                    'Good': '#4CAF50',
-                    'Moderate': '#FFEB3B',
-                    'Unhealthy for Sensitive Groups': '#FF9800',
-                    'Unhealthy': '#F44336',
-                    'Very Unhealthy': '#9C27B0',
-                    'Hazardous': '#800000'
-                }
+                color_discrete_map=utils.AQI_CATEGORY_COLORS
             )
             
             st.plotly_chart(fig, use_container_width=True)
@@ -337,17 +374,32 @@ else:
         # Data table with raw readings
         st.subheader("Raw Data")
         
-        display_df = df[['timestamp', 'aqi', 'category']].sort_values('timestamp', ascending=False)
+        # Rows arrive oldest first from the database, so newest first is a reversal
+        display_df = df[['timestamp', 'aqi', 'category']].iloc[::-1]
         display_df = display_df.rename(columns={'timestamp': 'Time', 'aqi': 'AQI', 'category': 'Category'})
         
+        # Only the newest rows are sent to the browser; more on request. The
+        # count starts over whenever the location or date range changes.
+        raw_filters = (st.session_state.location, start_date, end_date)
+        if st.session_state.get('raw_rows_filters') != raw_filters:
+            st.session_state.raw_rows_filters = raw_filters
+            st.session_state.raw_rows_shown = RAW_DATA_PAGE_ROWS
+        shown = st.session_state.raw_rows_shown
         st.dataframe(
-            display_df,
+            display_df.head(shown),
             use_container_width=True,
-            hide_index=True
+            hide_index=True,
+            height=400
         )
         
+        if len(display_df) > shown:
+            st.caption(f"Showing {shown} of {len(display_df)} rows. Download the CSV for the full data.")
+            if st.button("Show more"):
+                st.session_state.raw_rows_shown = shown + RAW_DATA_PAGE_ROWS
+                st.rerun()
+        
         # Download option
-        csv = df.to_csv(index=False).encode('utf-8')
+        csv = _csv_bytes(st.session_state.username, st.session_state.location, start_date, end_date)
         st.download_button(
             "Download Data as CSV",
             csv,
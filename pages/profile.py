@@ -2,12 +2,7 @@ import streamlit as st
 import pandas as pd
 from datetime import datetime, timedelta
 
-import sys
-import os
-
-# Add parent directory to path
-sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
-
+import cached
 import database
 import utils
 
@@ -33,6 +28,36 @@ if not st.session_state.authenticated:
 # Get database connection
 conn = database.get_connection()
 
+def _fresh_locations():
+    """
+    Saved locations read straight from the database, so a write doesn't undo
+    changes made on another page while the cached copy was still live
+    """
+    user_data = database.get_user_data(conn, st.session_state.username)
+    return user_data.get('saved_locations', []) if user_data else []
+
+def _write_locations(locations):
+    """
+    Save a user's locations and drop every copy of the old list
+    """
+    database.update_user_locations(conn, st.session_state.username, locations)
+    st.session_state.locations = locations
+    cached.user_data.clear()
+
+@st.cache_data(ttl=300, show_spinner="Fetching historical data...")
+def _fetch_hist(username, locations, start_date, end_date):
+    """
+    Historical AQI readings for all of a user's locations in a date range,
+    reused across reruns
+    """
+    return database.get_historical_aqi_bulk(
+        database.get_connection(),
+        username,
+        locations,
+        start_date,
+        end_date
+    )
+
 # Sidebar
 with st.sidebar:
     st.title("🌬️ AirQual")
@@ -53,7 +78,7 @@ if section == "Account Information":
     st.header("Account Information")
     
     # Basic user info
-    user_data = database.get_user_data(conn, st.session_state.username)
+    user_data = cached.user_data(st.session_state.username)
     
     if user_data:
         st.subheader("Your Details")
@@ -97,7 +122,7 @@ elif section == "Saved Locations":
     st.header("Saved Locations")
     
     # Get user's saved locations
-    user_data = database.get_user_data(conn, st.session_state.username)
+    user_data = cached.user_data(st.session_state.username)
     saved_locations = user_data.get('saved_locations', []) if user_data else []
     
     if saved_locations:
@@ -130,8 +155,7 @@ elif section == "Saved Locations":
                 
                 with col2:
                     if st.button("Remove", key=f"remove_{i}"):
-                        saved_locations.remove(location)
-                        database.update_user_locations(conn, st.session_state.username, saved_locations)
+                        _write_locations([loc for loc in _fresh_locations() if loc != location])
                         st.success(f"Removed {location} from your saved locations")
                         st.rerun()
         
@@ -140,9 +164,9 @@ elif section == "Saved Locations":
         new_location = st.text_input("Enter city name")
         
         if st.button("Add Location") and new_location:
+            saved_locations = _fresh_locations()
             if new_location not in saved_locations:
-                saved_locations.append(new_location)
-                database.update_user_locations(conn, st.session_state.username, saved_locations)
+                _write_locations(saved_locations + [new_location])
                 st.success(f"Added {new_location} to your saved locations")
                 st.rerun()
             else:
@@ -155,7 +179,10 @@ elif section == "Saved Locations":
         new_location = st.text_input("Enter city name")
         
         if st.button("Add Location") and new_location:
-            database.update_user_locations(conn, st.session_state.username, [new_location])
+            saved_locations = _fresh_locations()
+            if new_location not in saved_locations:
+                saved_locations.append(new_location)
+            _write_locations(saved_locations)
             st.success(f"Added {new_location} to your saved locations")
             st.rerun()
 
@@ -163,7 +190,7 @@ elif section == "Preferences":
     st.header("User Preferences")
     
     # Get current preferences
-    user_data = database.get_user_data(conn, st.session_state.username)
+    user_data = cached.user_data(st.session_state.username)
     current_unit = user_data.get('unit', 'metric') if user_data else 'metric'
     notification_prefs = user_data.get('notification_preferences', {}) if user_data else {}
     
@@ -215,6 +242,7 @@ elif section == "Preferences":
         }
         
         database.update_user_preference(conn, st.session_state.username, "notification_preferences", notification_prefs)
+        cached.user_data.clear()
         
         st.success("Preferences updated successfully!")
 
@@ -232,53 +260,42 @@ elif section == "Usage Statistics":
         st.error("Start date cannot be after end date")
     else:
         # Get all user locations
-        user_data = database.get_user_data(conn, st.session_state.username)
+        user_data = cached.user_data(st.session_state.username)
         all_locations = user_data.get('saved_locations', []) if user_data else []
         
         if not all_locations:
             st.info("You haven't saved any locations yet. Add locations to see usage statistics.")
         else:
-            # Get all AQI readings for the user in the date range
-            readings_by_location = {}
+            # Get all AQI readings for the user in the date range in one query
+            readings = pd.DataFrame(_fetch_hist(
+                st.session_state.username,
+                all_locations,
+                start_date,
+                end_date
+            ))
             
-            for location in all_locations:
-                historical_data = database.get_historical_aqi(
-                    conn, 
-                    st.session_state.username, 
-                    location,
-                    start_date,
-                    end_date
-                )
-                
-                if historical_data:
-                    readings_by_location[location] = historical_data
-            
-            if not readings_by_location:
+            if readings.empty:
                 st.info("No data available for the selected date range.")
             else:
                 # Total readings count
-                total_readings = sum(len(readings) for readings in readings_by_location.values())
+                total_readings = len(readings)
                 st.metric("Total Air Quality Readings", total_readings)
                 
                 # Locations with data
                 st.subheader("Locations Monitored")
                 
-                # Create a DataFrame with location stats
-                stats_data = []
-                
-                for location, readings in readings_by_location.items():
-                    if readings:
-                        df = pd.DataFrame(readings)
-                        stats_data.append({
-                            'Location': location,
-                            'Readings': len(df),
-                            'Avg AQI': round(df['aqi'].mean(), 1),
-                            'Max AQI': df['aqi'].max(),
-                            'Min AQI': df['aqi'].min()
-                        })
+                # Per-location stats in one pass, listed in saved order
+                monitored = set(readings['location'])
+                stats_df = (
+                    readings.groupby('location')['aqi']
+                    .agg(**{'Readings': 'count', 'Avg AQI': 'mean', 'Max AQI': 'max', 'Min AQI': 'min'})
+                    .reindex([loc for loc in dict.fromkeys(all_locations) if loc in monitored])
+                    .round({'Avg AQI': 1})
+                    .rename_axis('Location')
+                    .reset_index()
+                )
                 
-                if stats_data:
-                    stats_df = pd.DataFrame(stats_data)
+                if not stats_df.empty:
                     st.dataframe(stats_df, use_container_width=True)
                     
                     # Most monitored location
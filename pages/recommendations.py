@@ -1,20 +1,107 @@
 import streamlit as st
 import pandas as pd
-import plotly.express as px
-import plotly.graph_objects as go
-from datetime import datetime, timedelta
+import numpy as np
+from datetime import date, timedelta
+from bisect import bisect_left
 
-import sys
-import os
-
-# Add parent directory to path
-sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
-
-import data
+import cached
 import utils
 import database
 from recommendations import get_recommendations
 
+# Pollutant advice: inclusive upper bounds and the (impact, recommendation)
+# for each band, with one more band than bounds for values above the last
+POLLUTANT_ADVICE = {
+    'pm25': ((12, 35, 55), (
+        ("Minimal health risk. PM2.5 levels are good.",
+         "No special precautions needed."),
+        ("May cause respiratory symptoms in sensitive individuals with prolonged exposure.",
+         "People with respiratory or heart conditions should limit prolonged outdoor exertion."),
+        ("May cause increased respiratory symptoms in sensitive individuals.",
+         "People with respiratory or heart conditions should avoid outdoor exertion."),
+        ("May cause respiratory effects in the general population.",
+         "Everyone should reduce or avoid outdoor exertion."),
+    )),
+    'pm10': ((54, 154, 254), (
+        ("Minimal health risk. PM10 levels are good.",
+         "No special precautions needed."),
+        ("May cause respiratory irritation with prolonged exposure.",
+         "Unusually sensitive people should consider reducing prolonged outdoor exertion."),
+        ("May cause respiratory symptoms in sensitive groups.",
+         "People with respiratory disease should limit outdoor exertion."),
+        ("May cause respiratory effects in the general population.",
+         "Everyone should reduce outdoor exertion."),
+    )),
+    'o3': ((54, 124), (
+        ("Minimal health risk. Ozone levels are good.",
+         "No special precautions needed."),
+        ("May cause respiratory irritation during prolonged outdoor activity.",
+         "Unusually sensitive people should consider limiting prolonged outdoor exertion."),
+        ("May cause respiratory effects and breathing discomfort in sensitive groups and active people.",
+         "People with respiratory conditions, children, and older adults should limit outdoor activity."),
+    )),
+}
+
+# Pollutants with advice: (normalized key, expander title)
+POLLUTANT_SECTIONS = (
+    ('pm25', "PM2.5 - Fine Particulate Matter"),
+    ('pm10', "PM10 - Coarse Particulate Matter"),
+    ('o3', "O3 - Ozone"),
+)
+
+# Static guidance, each section rendered with a single markdown call
+SYMPTOMS_MD = """**Common symptoms to watch for:**
+
+- Coughing or throat irritation
+- Shortness of breath
+- Wheezing
+- Eye irritation
+- Fatigue
+- Chest discomfort"""
+
+MEDICAL_ATTENTION_MD = """**When to seek medical attention:**
+
+- Severe shortness of breath
+- Chest pain
+- Severe wheezing
+- Symptoms that don't improve after taking medication
+- Symptoms that worsen despite taking precautions"""
+
+INDOOR_TIPS_MD = """**1. Use air purifiers with HEPA filters**
+
+**2. Keep windows closed when outdoor air quality is poor**
+
+**3. Avoid activities that generate indoor pollutants:**
+
+- Smoking
+- Burning candles or incense
+- Using aerosol products
+
+**4. Regularly clean and maintain your home:**
+
+- Vacuum with HEPA filter
+- Dust with damp cloth
+- Wash bedding weekly
+
+**5. Control humidity levels (keep between 30-50%)**
+
+**6. Ensure proper ventilation when cooking**"""
+
+RESOURCES_MD = """**Recommended Resources:**
+
+- [EPA: Air Quality and Health](https://www.epa.gov/air-research/air-quality-and-health)
+- [WHO: Ambient Air Pollution](https://www.who.int/news-room/fact-sheets/detail/ambient-(outdoor)-air-quality-and-health)
+- [CDC: Air Quality](https://www.cdc.gov/air/default.htm)
+- [AirNow: Air Quality Information](https://www.airnow.gov/)
+- [American Lung Association: Air Quality](https://www.lung.org/clean-air)"""
+
+def _pollutant_advice(key, value):
+    """
+    Health impact and recommendation for a pollutant concentration
+    """
+    bounds, advice = POLLUTANT_ADVICE[key]
+    return advice[bisect_left(bounds, value)]
+
 # Page configuration
 st.set_page_config(
     page_title="AirQual - Health Recommendations",
@@ -38,8 +125,35 @@ if not st.session_state.authenticated:
     st.warning("Please login to access health recommendations")
     st.stop()
 
-# Get database connection
-conn = database.get_connection()
+@st.cache_data(ttl=86400, show_spinner=False)
+def _cached_trend(username, location, day):
+    """
+    AQI forecast from the last 30 days of readings, fitted once per day for
+    each user and location
+    """
+    rows = database.get_historical_aqi(
+        database.get_connection(),
+        username,
+        location,
+        day - timedelta(days=30),
+        day
+    )
+    return utils.predict_aqi_trend(rows)
+
+@st.cache_data(ttl=300, show_spinner=False)
+def _has_history(username, location, since):
+    """
+    Whether there are enough readings to forecast from; users without them
+    skip the 30-day fetch, and a "not enough data" forecast is never cached
+    for the rest of the day
+    """
+    return database.has_history(
+        database.get_connection(),
+        username,
+        location,
+        since,
+        min_readings=utils.MIN_TREND_READINGS
+    )
 
 # Sidebar
 with st.sidebar:
@@ -50,27 +164,28 @@ with st.sidebar:
     st.subheader("Select Location")
     
     # Get user's saved locations
-    user_data = database.get_user_data(conn, st.session_state.username)
+    user_data = cached.user_data(st.session_state.username)
     saved_locations = user_data.get('saved_locations', []) if user_data else []
     
-    if saved_locations:
-        locations = saved_locations.copy()
+    # Changes apply only when the form is submitted, not on every widget edit
+    with st.form("location_form", border=False):
+        if saved_locations:
+            # Ensure current location is in the options
+            locations = tuple(saved_locations)
+            if st.session_state.location not in locations:
+                locations += (st.session_state.location,)
+                
+            location = st.selectbox(
+                "Choose from saved locations",
+                options=locations,
+                index=locations.index(st.session_state.location)
+            )
+        else:
+            location = st.text_input("Enter location", value=st.session_state.location)
         
-        # Ensure current location is in the list
-        if st.session_state.location not in locations:
-            locations.append(st.session_state.location)
-            
-        location = st.selectbox(
-            "Choose from saved locations",
-            options=locations,
-            index=locations.index(st.session_state.location)
-        )
-    else:
-        location = st.text_input("Enter location", value=st.session_state.location)
-    
-    if st.button("Set Location"):
-        st.session_state.location = location
-        st.rerun()
+        if st.form_submit_button("Set Location"):
+            st.session_state.location = location
+            st.rerun()
     
     # User health profile
     st.subheader("Your Health Profile")
@@ -86,51 +201,64 @@ with st.sidebar:
         "Children",
         "Other"
     ]
-    
-    # Save health condition in session state if not already present
-    if 'health_condition' not in st.session_state:
-        st.session_state.health_condition = "None/Healthy"
-    
-    condition = st.selectbox(
-        "Health Condition",
-        options=health_conditions,
-        index=health_conditions.index(st.session_state.health_condition)
-    )
-    
-    if condition == "Other":
-        custom_condition = st.text_input("Specify condition")
-        if custom_condition:
-            st.session_state.health_condition = custom_condition
-    else:
-        st.session_state.health_condition = condition
-    
-    # Additional health factors
-    st.session_state.age_group = st.selectbox(
-        "Age Group",
-        options=["Child (0-12)", "Teen (13-18)", "Adult (19-60)", "Senior (60+)"],
-        index=2  # Default to Adult
-    )
-    
-    st.session_state.activity_level = st.selectbox(
-        "Activity Level",
-        options=["Sedentary", "Light Activity", "Moderate Activity", "Heavy Outdoor Activity"],
-        index=1  # Default to Light Activity
-    )
+    age_groups = ["Child (0-12)", "Teen (13-18)", "Adult (19-60)", "Senior (60+)"]
+    activity_levels = ["Sedentary", "Light Activity", "Moderate Activity", "Heavy Outdoor Activity"]
+    
+    # Save health profile defaults in session state if not already present
+    st.session_state.setdefault('health_condition', "None/Healthy")
+    st.session_state.setdefault('age_group', "Adult (19-60)")
+    st.session_state.setdefault('activity_level', "Light Activity")
+    
+    # Apply all profile changes in one rerun when the form is submitted
+    with st.form("health_profile_form", border=False):
+        current_condition = st.session_state.health_condition
+        is_custom = current_condition not in health_conditions
+        
+        condition = st.selectbox(
+            "Health Condition",
+            options=health_conditions,
+            index=health_conditions.index("Other" if is_custom else current_condition)
+        )
+        custom_condition = st.text_input(
+            "Specify condition (if Other)",
+            value=current_condition if is_custom else ""
+        )
+        
+        # Additional health factors
+        age_group = st.selectbox(
+            "Age Group",
+            options=age_groups,
+            index=age_groups.index(st.session_state.age_group)
+        )
+        activity_level = st.selectbox(
+            "Activity Level",
+            options=activity_levels,
+            index=activity_levels.index(st.session_state.activity_level)
+        )
+        
+        if st.form_submit_button("Apply"):
+            if condition != "Other":
+                st.session_state.health_condition = condition
+            elif custom_condition:
+                st.session_state.health_condition = custom_condition
+            st.session_state.age_group = age_group
+            st.session_state.activity_level = activity_level
 
 # Main content
 st.title("Health Recommendations")
 st.write(f"Based on air quality in **{st.session_state.location}**")
 
-# Fetch current AQI data if not already available
-if not st.session_state.current_aqi or st.session_state.current_aqi.get('location') != st.session_state.location:
-    with st.spinner("Fetching air quality data..."):
-        aqi_data = data.get_current_aqi(st.session_state.location)
-        if aqi_data:
-            st.session_state.current_aqi = aqi_data
+# Fetch current AQI data, shared with the other pages and sessions
+with st.spinner("Fetching air quality data..."):
+    aqi_data = cached.current_aqi(st.session_state.location)
+if aqi_data:
+    st.session_state.current_aqi = aqi_data
+    if aqi_data.get('stale'):
+        st.warning("The air quality service is unavailable right now. Showing the last known reading.")
 
 # Display recommendations
-if st.session_state.current_aqi:
-    aqi_value = st.session_state.current_aqi.get('aqi', 0)
+if aqi_data:
+    aqi_value = aqi_data.get('aqi', 0)
     aqi_category, aqi_color = utils.get_aqi_category(aqi_value)
     
     # Display AQI status
@@ -182,75 +310,33 @@ if st.session_state.current_aqi:
     col1, col2 = st.columns(2)
     
     with col1:
-        st.write("**Indoor Protection:**")
-        for item in detailed_recs['indoor_protection']:
-            st.write(f"- {item}")
+        st.markdown("**Indoor Protection:**\n\n" + "\n".join(f"- {item}" for item in detailed_recs['indoor_protection']))
     
     with col2:
-        st.write("**Outdoor Protection:**")
-        for item in detailed_recs['outdoor_protection']:
-            st.write(f"- {item}")
+        st.markdown("**Outdoor Protection:**\n\n" + "\n".join(f"- {item}" for item in detailed_recs['outdoor_protection']))
     
     # AQI impact explanation
     st.subheader("Health Impact Information")
     st.write(detailed_recs['health_impacts'])
     
     # Display pollutant-specific advice if available
-    pollutants = st.session_state.current_aqi.get('pollutants', {})
+    # Normalize keys once so 'PM2.5' and 'pm25' are a single lookup
+    pollutants = {
+        key.lower().replace('.', '').replace('_', ''): value
+        for key, value in aqi_data.get('pollutants', {}).items()
+    }
     if pollutants:
         st.subheader("Pollutant-Specific Advice")
         
         # Create expandable sections for each pollutant
-        if 'pm25' in pollutants or 'PM2.5' in pollutants:
-            pm25_val = pollutants.get('pm25', pollutants.get('PM2.5', 0))
-            with st.expander("PM2.5 - Fine Particulate Matter"):
-                st.write(f"**Current level:** {pm25_val} μg/m³")
-                
-                if pm25_val <= 12:
-                    st.write("**Health impact:** Minimal health risk. PM2.5 levels are good.")
-                    st.write("**Recommendation:** No special precautions needed.")
-                elif pm25_val <= 35:
-                    st.write("**Health impact:** May cause respiratory symptoms in sensitive individuals with prolonged exposure.")
-                    st.write("**Recommendation:** People with respiratory or heart conditions should limit prolonged outdoor exertion.")
-                elif pm25_val <= 55:
-                    st.write("**Health impact:** May cause increased respiratory symptoms in sensitive individuals.")
-                    st.write("**Recommendation:** People with respiratory or heart conditions should avoid outdoor exertion.")
-                else:
-                    st.write("**Health impact:** May cause respiratory effects in the general population.")
-                    st.write("**Recommendation:** Everyone should reduce or avoid outdoor exertion.")
-        
-        if 'pm10' in pollutants or 'PM10' in pollutants:
-            pm10_val = pollutants.get('pm10', pollutants.get('PM10', 0))
-            with st.expander("PM10 - Coarse Particulate Matter"):
-                st.write(f"**Current level:** {pm10_val} μg/m³")
-                
-                if pm10_val <= 54:
-                    st.write("**Health impact:** Minimal health risk. PM10 levels are good.")
-                    st.write("**Recommendation:** No special precautions needed.")
-                elif pm10_val <= 154:
-                    st.write("**Health impact:** May cause respiratory irritation with prolonged exposure.")
-                    st.write("**Recommendation:** Unusually sensitive people should consider reducing prolonged outdoor exertion.")
-                elif pm10_val <= 254:
-                    st.write("**Health impact:** May cause respiratory symptoms in sensitive groups.")
-                    st.write("**Recommendation:** People with respiratory disease should limit outdoor exertion.")
-                else:
-                    st.write("**Health impact:** May cause respiratory effects in the general population.")
-                    st.write("**Recommendation:** Everyone should reduce outdoor exertion.")
-        
-        if 'o3' in pollutants or 'O3' in pollutants:
-            o3_val = pollutants.get('o3', pollutants.get('O3', 0))
-            with st.expander("O3 - Ozone"):
-                st.write(f"**Current level:** {o3_val} μg/m³")
-                
-                if o3_val <= 54:
-                    st.write("**Health impact:** Minimal health risk. Ozone levels are good.")
-                    st.write("**Recommendation:** No special precautions needed.")
-                elif o3_val <= 124:
-                    st.write("**Health impact:** May cause respiratory irritation during prolonged outdoor activity.")
-                    st.write("**Recommendation:** Unusually sensitive people should consider limiting prolonged outdoor exertion.")
-                else:
-                    st.write("**Health impact:** May cause respiratory effects and breathing discomfort in sensitive groups and active people.")
-                    st.write("**Recommendation:** People with respiratory conditions, children, and older adults should limit outdoor activity.")
+        for key, title in POLLUTANT_SECTIONS:
+            if key in pollutants:
+                value = pollutants[key]
+                impact, recommendation = _pollutant_advice(key, value)
+                with st.expander(title):
+                    st.write(f"**Current level:** {value} μg/m³")
+                    st.write(f"**Health impact:** {impact}")
+                    st.write(f"**Recommendation:** {recommendation}")
     
     # Health monitoring section
     st.subheader("Daily Health Monitoring")
@@ -260,71 +346,57 @@ if st.session_state.current_aqi:
     col1, col2 = st.columns(2)
     
     with col1:
-        st.write("**Common symptoms to watch for:**")
-        st.write("- Coughing or throat irritation")
-        st.write("- Shortness of breath")
-        st.write("- Wheezing")
-        st.write("- Eye irritation")
-        st.write("- Fatigue")
-        st.write("- Chest discomfort")
+        st.markdown(SYMPTOMS_MD)
     
     with col2:
-        st.write("**When to seek medical attention:**")
-        st.write("- Severe shortness of breath")
-        st.write("- Chest pain")
-        st.write("- Severe wheezing")
-        st.write("- Symptoms that don't improve after taking medication")
-        st.write("- Symptoms that worsen despite taking precautions")
+        st.markdown(MEDICAL_ATTENTION_MD)
     
     # Air quality forecast and planning
     st.subheader("Plan Your Week")
     
     # Try to predict trend for next few days
-    trend_prediction = utils.predict_aqi_trend(
-        database.get_historical_aqi(
-            conn, 
-            st.session_state.username, 
-            st.session_state.location,
-            datetime.now() - timedelta(days=30),
-            datetime.now()
-        )
-    )
+    today = date.today()
+    trend_prediction = None
+    if _has_history(st.session_state.username, st.session_state.location, today - timedelta(days=30)):
+        trend_prediction = _cached_trend(st.session_state.username, st.session_state.location, today)
     
     if trend_prediction:
         st.write("Based on historical trends, here's a forecast of air quality for the next few days:")
         
         # Create forecast table
         forecast_df = pd.DataFrame(trend_prediction)
-        forecast_df['category'] = forecast_df['aqi'].apply(lambda x: utils.get_aqi_category(x)[0])
-        forecast_df['color'] = forecast_df['aqi'].apply(lambda x: utils.get_aqi_category(x)[1])
+        forecast_df['category'] = utils.get_aqi_categories(forecast_df['aqi'])
+        forecast_df['color'] = forecast_df['category'].map(utils.AQI_CATEGORY_COLORS)
         
         # Format date
         forecast_df['date'] = pd.to_datetime(forecast_df['date']).dt.strftime('%a, %b %d')
         
-        # Display forecast in columns
-        cols = st.columns(len(forecast_df))
-        
-        for i, (_, row) in enumerate(forecast_df.iterrows()):
-            with cols[i]:
-                st.markdown(
-                    f"""
-                    <div style="background-color:{row['color']};padding:10px;border-radius:5px;text-align:center;">
-                        <p style="color:white;margin:0;">{row['date']}</p>
-                        <h3 style="color:white;margin:0;">{row['aqi']}</h3>
-                        <p style="color:white;margin:0;">{row['category']}</p>
-                    </div>
-                    """,
-                    unsafe_allow_html=True
-                )
+        # Render all forecast cards as one flex row; each card is built on a
+        # single line so markdown doesn't end the HTML block early
+        cards = "".join(
+            f'<div style="flex:1;background-color:{color};padding:10px;border-radius:5px;text-align:center;">'
+            f'<p style="color:white;margin:0;">{day}</p>'
+            f'<h3 style="color:white;margin:0;">{day_aqi}</h3>'
+            f'<p style="color:white;margin:0;">{category}</p>'
+            '</div>'
+            for day, day_aqi, category, color in zip(
+                forecast_df['date'].to_numpy(),
+                forecast_df['aqi'].to_numpy(),
+                forecast_df['category'].to_numpy(),
+                forecast_df['color'].to_numpy()
+            )
+        )
+        st.markdown(f'<div style="display:flex;gap:10px;">{cards}</div>', unsafe_allow_html=True)
         
         # Activity planning advice
         st.write("**Activity Planning Advice:**")
         
-        best_day = forecast_df.loc[forecast_df['aqi'].idxmin()]
-        worst_day = forecast_df.loc[forecast_df['aqi'].idxmax()]
+        dates = forecast_df['date'].to_numpy()
+        aqis = forecast_df['aqi'].to_numpy()
+        best, worst = int(np.argmin(aqis)), int(np.argmax(aqis))
         
-        st.write(f"- Best day for outdoor activities: **{best_day['date']}** (AQI: {best_day['aqi']})")
-        st.write(f"- Day to take extra precautions: **{worst_day['date']}** (AQI: {worst_day['aqi']})")
+        st.write(f"- Best day for outdoor activities: **{dates[best]}** (AQI: {aqis[best]})")
+        st.write(f"- Day to take extra precautions: **{dates[worst]}** (AQI: {aqis[worst]})")
         
         # Suggestion based on user's activity level
         if st.session_state.activity_level in ["Moderate Activity", "Heavy Outdoor Activity"]:
@@ -339,27 +411,11 @@ if st.session_state.current_aqi:
     
     # Air quality improvement tips
     with st.expander("Tips to Improve Indoor Air Quality"):
-        st.write("**1. Use air purifiers with HEPA filters**")
-        st.write("**2. Keep windows closed when outdoor air quality is poor**")
-        st.write("**3. Avoid activities that generate indoor pollutants:**")
-        st.write("   - Smoking")
-        st.write("   - Burning candles or incense")
-        st.write("   - Using aerosol products")
-        st.write("**4. Regularly clean and maintain your home:**")
-        st.write("   - Vacuum with HEPA filter")
-        st.write("   - Dust with damp cloth")
-        st.write("   - Wash bedding weekly")
-        st.write("**5. Control humidity levels (keep between 30-50%)**")
-        st.write("**6. Ensure proper ventilation when cooking**")
+        st.markdown(INDOOR_TIPS_MD)
     
     # Educational resources
     with st.expander("Learn More About Air Quality and Health"):
-        st.write("**Recommended Resources:**")
-        st.write("- [EPA: Air Quality and Health](https://www.epa.gov/air-research/air-quality-and-health)")
-        st.write("- [WHO: Ambient Air Pollution](https://www.who.int/news-room/fact-sheets/detail/ambient-(outdoor)-air-quality-and-health)")
-        st.write("- [CDC: Air Quality](https://www.cdc.gov/air/default.htm)")
-        st.write("- [AirNow: Air Quality Information](https://www.airnow.gov/)")
-        st.write("- [American Lung Association: Air Quality](https://www.lung.org/clean-air)")
+        st.markdown(RESOURCES_MD)
     
 else:
     st.error("Failed to fetch air quality data. Please check the location name or try again later.")
@@ -1,8 +1,27 @@
 import pandas as pd
 import numpy as np
-from datetime import datetime, timedelta
-from sklearn.ensemble import RandomForestRegressor
-import streamlit as st
+from datetime import datetime
+from bisect import bisect_left
+from functools import lru_cache
+
+# Upper bounds (inclusive) of each AQI category, with names and colors
+AQI_BREAKPOINTS = [50, 100, 150, 200, 300]
+AQI_CATEGORIES = [
+    "Good",
+    "Moderate",
+    "Unhealthy for Sensitive Groups",
+    "Unhealthy",
+    "Very Unhealthy",
+    "Hazardous"
+]
+AQI_COLORS = ["#4CAF50", "#FFEB3B", "#FF9800", "#F44336", "#9C27B0", "#800000"]
+AQI_CATEGORY_COLORS = dict(zip(AQI_CATEGORIES, AQI_COLORS))
+
+def aqi_band(aqi_value):
+    """
+    Index of the AQI category a value falls in, from 0 (Good) to 5 (Hazardous)
+    """
+    return bisect_left(AQI_BREAKPOINTS, aqi_value)
 
 def get_aqi_category(aqi_value):
     """
@@ -14,18 +33,27 @@ def get_aqi_category(aqi_value):
     Returns:
         tuple: (category_name, color_code)
     """
-    if aqi_value <= 50:
-        return "Good", "#4CAF50"  # Green
-    elif aqi_value <= 100:
-        return "Moderate", "#FFEB3B"  # Yellow
-    elif aqi_value <= 150:
-        return "Unhealthy for Sensitive Groups", "#FF9800"  # Orange
-    elif aqi_value <= 200:
-        return "Unhealthy", "#F44336"  # Red
-    elif aqi_value <= 300:
-        return "Very Unhealthy", "#9C27B0"  # Purple
-    else:
-        return "Hazardous", "#800000"  # Maroon
+    band = aqi_band(aqi_value)
+    return AQI_CATEGORIES[band], AQI_COLORS[band]
+
+def get_aqi_categories(aqi_values):
+    """
+    Determine AQI categories for a whole Series of values at once
+    
+    Args:
+        aqi_values (pd.Series): AQI values
+        
+    Returns:
+        pd.Series: Categorical series of category names
+    """
+    return pd.cut(
+        aqi_values,
+        bins=[-np.inf] + AQI_BREAKPOINTS + [np.inf],
+        labels=AQI_CATEGORIES
+    )
+
+# Fewest readings predict_aqi_trend will forecast from
+MIN_TREND_READINGS = 5
 
 def predict_aqi_trend(historical_data, days_to_predict=3):
     """
@@ -38,49 +66,107 @@ def predict_aqi_trend(historical_data, days_to_predict=3):
     Returns:
         list: Predicted AQI values
     """
-    if not historical_data or len(historical_data) < 5:
+    if not historical_data or len(historical_data) < MIN_TREND_READINGS:
         return None
     
-    # Create DataFrame from historical data
-    df = pd.DataFrame(historical_data)
-    
-    # Convert timestamp to datetime if it's not already
-    if df['timestamp'].dtype != 'datetime64[ns]':
-        df['timestamp'] = pd.to_datetime(df['timestamp'])
-    
-    # Extract features from datetime
-    df['day_of_week'] = df['timestamp'].dt.dayofweek
-    df['month'] = df['timestamp'].dt.month
-    df['day'] = df['timestamp'].dt.day
+    # Pull calendar days and values straight into arrays; pandas parses
+    # datetimes and ISO strings far faster than np.array does
+    days = pd.DatetimeIndex([row['timestamp'] for row in historical_data]).to_numpy().astype('datetime64[D]')
+    y = np.fromiter((row['aqi'] for row in historical_data), dtype=np.float64, count=len(historical_data))
     
-    # Features and target
-    X = df[['day_of_week', 'month', 'day']]
-    y = df['aqi']
+    # Mean AQI for each day of the week (Monday is 0), falling back to the
+    # overall mean for weekdays without readings
+    day_of_week = _day_of_week(days)
+    counts = np.bincount(day_of_week, minlength=7)
+    sums = np.bincount(day_of_week, weights=y, minlength=7)
+    weekday_means = np.where(counts > 0, sums / np.maximum(counts, 1), y.mean())
     
-    # Train a RandomForest model
-    model = RandomForestRegressor(n_estimators=50, random_state=42)
-    model.fit(X, y)
-    
-    # Generate dates for prediction
-    last_date = df['timestamp'].max()
-    future_dates = [last_date + timedelta(days=i+1) for i in range(days_to_predict)]
-    
-    # Create features for prediction
-    future_features = pd.DataFrame({
-        'day_of_week': [date.dayofweek for date in future_dates],
-        'month': [date.month for date in future_dates],
-        'day': [date.day for date in future_dates]
-    })
-    
-    # Make predictions
-    predictions = model.predict(future_features)
+    # Generate dates for prediction and look up their weekday means
+    future_days = days.max() + np.arange(1, days_to_predict + 1)
+    predictions = np.maximum(0, weekday_means[_day_of_week(future_days)].round(1))
     
     # Return predictions with dates
     return [
-        {'date': future_dates[i].strftime('%Y-%m-%d'), 'aqi': max(0, round(predictions[i], 1))}
-        for i in range(len(predictions))
+        {'date': str(day), 'aqi': float(aqi)}
+        for day, aqi in zip(np.datetime_as_string(future_days), predictions)
     ]
 
+def _day_of_week(days):
+    """
+    Day of the week, Monday being 0, for an array of datetime64[D] values
+    """
+    # 1970-01-01 was a Thursday
+    return (days.astype(np.int64) + 3) % 7
+
+# General advice for each AQI band, from Good to Hazardous
+BASE_ADVICE = (
+    "Air quality is good. It's a great day for outdoor activities.",
+    "Air quality is moderate. Most people can continue outdoor activities.",
+    "Air quality is unhealthy for sensitive groups. Consider reducing prolonged outdoor exertion.",
+    "Air quality is unhealthy. Everyone should reduce prolonged outdoor exertion.",
+    "Air quality is very unhealthy. Avoid outdoor activities when possible.",
+    "Air quality is hazardous. Avoid all outdoor activities.",
+)
+
+# Condition keywords and their advice for Good, Moderate, USG and anything worse
+CONDITION_ADVICE = (
+    (('asthma', 'copd', 'respiratory'), (
+        "With your respiratory condition, you should be comfortable outside today, but always keep your rescue inhaler available.",
+        "For people with asthma or COPD, watch for any symptoms while outdoors. Consider keeping outdoor activities moderate in duration.",
+        "With your respiratory condition, you should limit prolonged outdoor activities and keep medication handy. Consider wearing an N95 mask if you must be outside.",
+        "Given your respiratory condition, it's strongly advised to stay indoors with windows closed and air purifier running. If you must go outside, wear an N95 mask and limit exposure time.",
+    )),
+    (('heart', 'cardiovascular'), (
+        "With your heart condition, today's air quality is good for your regular outdoor activities.",
+        "For those with heart issues, maintain awareness of your exertion level and any unusual symptoms.",
+        "With your cardiovascular condition, consider indoor exercise today or reducing intensity of outdoor activities.",
+        "Given your heart condition, avoid outdoor exertion today. Air pollution can increase stress on your cardiovascular system.",
+    )),
+    (('allerg',), (
+        "Allergy sufferers should still monitor personal symptoms, but air quality today is generally favorable.",
+        "For allergy sufferers, consider taking your allergy medication before going outdoors today.",
+        "With your allergies, consider wearing a mask outside and taking allergy medication beforehand.",
+        "Given your allergy sensitivity, stay indoors with windows closed and air purifier running if possible.",
+    )),
+    (('pregna',), (
+        "For expectant mothers, today's air quality is good for normal outdoor activities.",
+        "Pregnant women should monitor how they feel during outdoor activities and take breaks as needed.",
+        "As an expectant mother, consider limiting prolonged outdoor exposure today to protect both you and your baby.",
+        "For the health of you and your baby, it's advised to stay indoors today and keep windows closed.",
+    )),
+)
+
+# Advice for other conditions once AQI is above Moderate
+OTHER_CONDITION_ADVICE = "Given your health situation, pay close attention to any unusual symptoms when outdoors and reduce exposure time if needed."
+
+def _build_personalized_advice():
+    """
+    Full advice text for every (condition group, AQI band) pair; group None
+    covers conditions without specific advice
+    """
+    table = {}
+    for band, base_advice in enumerate(BASE_ADVICE):
+        for group, (_, advice) in enumerate(CONDITION_ADVICE):
+            table[group, band] = f"{base_advice}\n\nPersonalized advice: {advice[min(band, 3)]}"
+        if band >= 2:
+            table[None, band] = f"{base_advice}\n\nPersonalized advice: {OTHER_CONDITION_ADVICE}"
+        else:
+            table[None, band] = base_advice
+    return table
+
+PERSONALIZED_ADVICE = _build_personalized_advice()
+
+@lru_cache(maxsize=256)
+def _condition_group(health_condition):
+    """
+    Index of the first CONDITION_ADVICE entry matching a condition, or None
+    """
+    condition_lower = health_condition.lower()
+    for group, (keywords, _) in enumerate(CONDITION_ADVICE):
+        if any(keyword in condition_lower for keyword in keywords):
+            return group
+    return None
+
 def get_personalized_recommendation(aqi, health_condition):
     """
     Generate personalized health recommendations based on AQI and health condition
@@ -92,80 +178,65 @@ def get_personalized_recommendation(aqi, health_condition):
     Returns:
         str: Personalized recommendation
     """
-    condition_lower = health_condition.lower()
-    
-    # Base advice based on AQI level
-    if aqi <= 50:
-        base_advice = "Air quality is good. It's a great day for outdoor activities."
-    elif aqi <= 100:
-        base_advice = "Air quality is moderate. Most people can continue outdoor activities."
-    elif aqi <= 150:
-        base_advice = "Air quality is unhealthy for sensitive groups. Consider reducing prolonged outdoor exertion."
-    elif aqi <= 200:
-        base_advice = "Air quality is unhealthy. Everyone should reduce prolonged outdoor exertion."
-    elif aqi <= 300:
-        base_advice = "Air quality is very unhealthy. Avoid outdoor activities when possible."
-    else:
-        base_advice = "Air quality is hazardous. Avoid all outdoor activities."
-    
-    # Specific advice based on health condition
-    specific_advice = ""
-    
-    if 'asthma' in condition_lower or 'copd' in condition_lower or 'respiratory' in condition_lower:
-        if aqi <= 50:
-            specific_advice = "With your respiratory condition, you should be comfortable outside today, but always keep your rescue inhaler available."
-        elif aqi <= 100:
-            specific_advice = "For people with asthma or COPD, watch for any symptoms while outdoors. Consider keeping outdoor activities moderate in duration."
-        elif aqi <= 150:
-            specific_advice = "With your respiratory condition, you should limit prolonged outdoor activities and keep medication handy. Consider wearing an N95 mask if you must be outside."
-        else:
-            specific_advice = "Given your respiratory condition, it's strongly advised to stay indoors with windows closed and air purifier running. If you must go outside, wear an N95 mask and limit exposure time."
-    
-    elif 'heart' in condition_lower or 'cardiovascular' in condition_lower:
-        if aqi <= 50:
-            specific_advice = "With your heart condition, today's air quality is good for your regular outdoor activities."
-        elif aqi <= 100:
-            specific_advice = "For those with heart issues, maintain awareness of your exertion level and any unusual symptoms."
-        elif aqi <= 150:
-            specific_advice = "With your cardiovascular condition, consider indoor exercise today or reducing intensity of outdoor activities."
-        else:
-            specific_advice = "Given your heart condition, avoid outdoor exertion today. Air pollution can increase stress on your cardiovascular system."
-    
-    elif 'allerg' in condition_lower:
-        if aqi <= 50:
-            specific_advice = "Allergy sufferers should still monitor personal symptoms, but air quality today is generally favorable."
-        elif aqi <= 100:
-            specific_advice = "For allergy sufferers, consider taking your allergy medication before going outdoors today."
-        elif aqi <= 150:
-            specific_advice = "With your allergies, consider wearing a mask outside and taking allergy medication beforehand."
-        else:
-            specific_advice = "Given your allergy sensitivity, stay indoors with windows closed and air purifier running if possible."
-    
-    elif 'pregna' in condition_lower:
-        if aqi <= 50:
-            specific_advice = "For expectant mothers, today's air quality is good for normal outdoor activities."
-        elif aqi <= 100:
-            specific_advice = "Pregnant women should monitor how they feel during outdoor activities and take breaks as needed."
-        elif aqi <= 150:
-            specific_advice = "As an expectant mother, consider limiting prolonged outdoor exposure today to protect both you and your baby."
-        else:
-            specific_advice = "For the health of you and your baby, it's advised to stay indoors today and keep windows closed."
-    
-    else:
-        # Generic advice for other/unspecified conditions
-        if aqi > 100:
-            specific_advice = "Given your health situation, pay close attention to any unusual symptoms when outdoors and reduce exposure time if needed."
-    
-    if specific_advice:
-        return f"{base_advice}\n\nPersonalized advice: {specific_advice}"
-    else:
-        return base_advice
+    return PERSONALIZED_ADVICE[_condition_group(health_condition), aqi_band(aqi)]
+
+# Display format for timestamps, e.g. "October 15, 2026 at 10:00"
+TIMESTAMP_FORMAT = "%B %d, %Y at %H:%M"
 
 def format_timestamp(timestamp):
     """
     Format a timestamp for display
     """
     if isinstance(timestamp, str):
-        timestamp = datetime.fromisoformat(timestamp.replace('Z', '+00:00'))
+        # fromisoformat accepts a trailing 'Z' since Python 3.11
+        timestamp = datetime.fromisoformat(timestamp)
+    
+    return timestamp.strftime(TIMESTAMP_FORMAT)
+
+def lttb_indices(x, y, threshold):
+    """
+    Pick the points of a series to keep when downsampling it for a chart,
+    using Largest-Triangle-Three-Buckets so peaks and dips survive
     
-    return timestamp.strftime("%B %d, %Y at %H:%M")
+    Args:
+        x (np.ndarray): Sorted numeric x values (e.g. timestamps as int64)
+        y (np.ndarray): Values to plot
+        threshold (int): Maximum number of points to keep
+        
+    Returns:
+        np.ndarray: Indices of the points to keep, in order
+    """
+    n = len(x)
+    if threshold >= n or threshold < 3:
+        return np.arange(n)
+    
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    
+    # First and last points are always kept; the rest are split into
+    # threshold - 2 buckets that each contribute one point
+    edges = (np.arange(threshold - 1) * ((n - 2) / (threshold - 2))).astype(np.int64) + 1
+    edges[-1] = n - 1
+    
+    indices = np.empty(threshold, dtype=np.int64)
+    indices[0] = 0
+    indices[-1] = n - 1
+    
+    a = 0
+    for i in range(threshold - 2):
+        start, end = edges[i], edges[i + 1]
+        next_end = edges[i + 2] if i + 2 < len(edges) else n
+        
+        # Average of the next bucket is the third triangle corner
+        avg_x = x[end:next_end].mean()
+        avg_y = y[end:next_end].mean()
+        
+        # Keep the point forming the largest triangle with the previous pick
+        area = np.abs(
+            (x[a] - avg_x) * (y[start:end] - y[a])
+            - (x[a] - x[start:end]) * (avg_y - y[a])
+        )
+        a = start + int(np.argmax(area))
+        indices[i + 1] = a
+    
+    return indices